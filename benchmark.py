@@ -0,0 +1,297 @@
+"""
+Benchmarks for the hot paths: making paths, filling boards, solving, rendering, the similarity search
+and the chess variant. Every case runs from a fixed seed so two runs do the same work, and records its
+time, its peak memory (measured in a separate run under tracemalloc) and counters such as restarts
+and backtracks. Results are saved as JSON so runs from before and after a change can be compared.
+
+    python benchmark.py run --out before.json
+    python benchmark.py run --out after.json --quick --filter path,fill
+    python benchmark.py compare before.json after.json
+"""
+
+import argparse
+import json
+import os
+import pickle
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+import custom_board_finder
+from logic import Board, GenerationError
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'variants'))
+import chess_logic
+import chess_solver
+
+
+SIZES = [6, 8, 10, 15, 20, 30]
+QUICK_SIZES = [6, 10, 20]
+BIASES = [0.25, 0.75]
+RENDER_SIZES = [6, 10, 20]
+SIMILARITY_BOARDS = [2000, 10000]
+CHESS_SIZES = [8, 12]
+IMPORT_MODULES = ['logic', 'generate_boards', 'rendering']
+HEAVY_MODULES = ['PIL', 'matplotlib'] # Libraries only drawing should need.
+SEED = 1
+PATH_BACKTRACKS = 100000 # Budget of the unguided path case, so a walk that thrashes is recorded instead of hanging the run.
+
+
+def made_board(m, n, max_distance=None, difficulty_bias=0.25, seed=SEED, fill=True):
+    b = Board(m, n, max_distance=max_distance, seed=seed)
+    b.create_random_path(difficulty_bias=difficulty_bias, guided=True) # Only needs to be a path, so it is kept bounded
+    if fill:
+        b.fill_remaining_squares(restart_for_zeros=True)
+    return b
+
+
+# Every case below takes its parameters and returns a function that does the timed work once and
+# returns a dict of counters. Anything built before that function is not timed.
+
+def path_case(m, n, max_distance, difficulty_bias):
+    def run():
+        b = Board(m, n, max_distance=max_distance, seed=SEED)
+        try:
+            b.create_random_path(difficulty_bias=difficulty_bias, max_backtracks=PATH_BACKTRACKS)
+        except GenerationError:
+            return {'restarts': b.restarts, 'backtracks': b.backtracks, 'budget_exceeded': True}
+        return {'restarts': b.restarts, 'backtracks': b.backtracks, 'path_length': len(b.path)}
+    return run
+
+
+def guided_path_case(m, n, max_distance, difficulty_bias):
+    def run():
+        b = Board(m, n, max_distance=max_distance, seed=SEED)
+        b.create_random_path(difficulty_bias=difficulty_bias, guided=True)
+        return {'restarts': b.restarts, 'backtracks': b.backtracks, 'path_length': len(b.path)}
+    return run
+
+
+def fill_case(m, n, max_distance, difficulty_bias):
+    with_path = pickle.dumps(made_board(m, n, max_distance, difficulty_bias, fill=False))
+
+    def run():
+        b = pickle.loads(with_path)
+        b.rng = np.random.default_rng(SEED)
+        b.fill_remaining_squares(restart_for_zeros=True)
+        return {'fill_restarts': b.fill_restarts, 'dud_squares': len(b.dud_squares)}
+    return run
+
+
+def solve_case(m, n, max_distance, difficulty_bias):
+    b = made_board(m, n, max_distance, difficulty_bias)
+
+    def run():
+        path, count = b.solve(cap=2)
+        return {'solutions': count, 'solution_length': len(path) - 1}
+    return run
+
+
+def render_case(m, n):
+    b = made_board(m, n)
+    folder = tempfile.mkdtemp()
+
+    def run():
+        b.create_board_images(os.path.join(folder, 'board.png'), os.path.join(folder, 'solution.png'))
+        return {'bytes': os.path.getsize(os.path.join(folder, 'board.png')) + os.path.getsize(os.path.join(folder, 'solution.png'))}
+    return run
+
+
+def similarity_case(boards):
+    rng = np.random.default_rng(SEED)
+    features = rng.integers(0, 20, size=(boards, custom_board_finder.MAX_TILE)).astype(np.uint16)
+
+    def run():
+        graph = custom_board_finder.similarity_graph(features, max_distance=6)
+        chosen = custom_board_finder.select_similar(features, max_distance=6, graph=graph, k=50)
+        return {'edges': len(graph[1]) // 2, 'chosen': len(chosen)}
+    return run
+
+
+def import_case(module):
+    """
+    Starts a fresh interpreter that imports module, the way a new worker process would. The time
+    is for the whole process, the counters hold the import alone and which heavy libraries came with it.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    code = (
+        'import sys, time; started = time.perf_counter(); '
+        f'import {module}; '
+        'print(time.perf_counter() - started, *[name for name in HEAVY_MODULES if name in sys.modules])'
+    ).replace('HEAVY_MODULES', repr(HEAVY_MODULES))
+
+    def run():
+        output = subprocess.run([sys.executable, '-c', code], cwd=here, capture_output=True, text=True, check=True).stdout.split()
+        return {'import_ms': float(output[0]) * 1000, 'loaded': output[1:]}
+    return run
+
+
+def chess_generate_case(m, n, difficulty_bias):
+    def run():
+        cb = chess_logic.Chessboard(m, n, seed=SEED).generate(difficulty_bias=difficulty_bias)
+        return {'restarts': cb.restarts, 'backtracks': cb.backtracks, 'fill_restarts': cb.fill_restarts, 'path_length': len(cb.path)}
+    return run
+
+
+def chess_solve_case(board):
+    def run():
+        path, count = chess_solver.Chessboard(board).solve(cap=2)
+        return {'solutions': count}
+    return run
+
+
+def cases(quick=False):
+    """
+    Yields (name, params, make_run) for every case. make_run() does the untimed setup and returns the run function.
+    """
+    sizes = QUICK_SIZES if quick else SIZES
+    for size in sizes:
+        for max_distance in dict.fromkeys([size - 2, size // 2]): # The default, (m + n) // 2 - 2, and a shorter one
+            for difficulty_bias in BIASES:
+                params = {'m': size, 'n': size, 'max_distance': max_distance, 'difficulty_bias': difficulty_bias}
+                yield 'path', params, lambda p=params: path_case(**p)
+                yield 'path_guided', params, lambda p=params: guided_path_case(**p)
+                yield 'fill', params, lambda p=params: fill_case(**p)
+                yield 'solve', params, lambda p=params: solve_case(**p)
+
+    for module in IMPORT_MODULES:
+        params = {'module': module}
+        yield 'import', params, lambda p=params: import_case(**p)
+
+    for size in RENDER_SIZES:
+        params = {'m': size, 'n': size}
+        yield 'render', params, lambda p=params: render_case(**p)
+
+    for boards in SIMILARITY_BOARDS[:1] if quick else SIMILARITY_BOARDS:
+        params = {'boards': boards}
+        yield 'similarity', params, lambda p=params: similarity_case(**p)
+
+    for size in CHESS_SIZES:
+        for difficulty_bias in BIASES:
+            params = {'m': size, 'n': size, 'difficulty_bias': difficulty_bias}
+            yield 'chess_generate', params, lambda p=params: chess_generate_case(**p)
+
+    for name in ['original', 'b']:
+        params = {'board': name}
+        yield 'chess_solve', params, lambda name=name: chess_solve_case(getattr(chess_solver, name))
+
+
+def measure(run, repeat):
+    """
+    Times repeat calls of run, then calls it once more under tracemalloc for the peak memory.
+    """
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        counters = run()
+        times.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'time': {'min': min(times), 'median': statistics.median(times), 'mean': statistics.mean(times)},
+        'peak_kib': peak / 1024,
+        'counters': counters,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_all(repeat=3, quick=False, only=None):
+    results = []
+    for name, params, make_run in cases(quick=quick):
+        if only is not None and name not in only:
+            continue
+        result = {'name': name, 'params': params, **measure(make_run(), repeat)}
+        results.append(result)
+        print(f"{name:<15} {json.dumps(params):<75} {result['time']['median'] * 1000:10.2f} ms {result['peak_kib']:10.0f} KiB  {result['counters']}", flush=True)
+
+    return {
+        'meta': {
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'repeat': repeat,
+            'seed': SEED,
+        },
+        'results': results,
+    }
+
+
+def compare(before, after, threshold=0.1):
+    """
+    Prints the change in median time and peak memory of every case in both runs. Returns the cases
+    that got slower by more than threshold (0.1 is 10%).
+    """
+    key = lambda result: (result['name'], json.dumps(result['params'], sort_keys=True))
+    old = {key(result): result for result in before['results']}
+
+    regressions = []
+    for result in after['results']:
+        if key(result) not in old:
+            continue
+        previous = old[key(result)]
+        ratio = result['time']['median'] / previous['time']['median'] if previous['time']['median'] else float('inf')
+        memory = result['peak_kib'] / previous['peak_kib'] if previous['peak_kib'] else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = 'SLOWER'
+            regressions.append(result)
+        elif ratio < 1 / (1 + threshold):
+            flag = 'faster'
+        print(f"{result['name']:<15} {key(result)[1]:<75} {ratio:6.2f}x time {memory:6.2f}x memory  {flag}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark generation, filling, solving, rendering and search.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Run the benchmarks and save the results as JSON.")
+    run.add_argument("--out", default="benchmark.json")
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--quick", action="store_true", help="Fewer board sizes, for a fast check.")
+    run.add_argument("--filter", default=None, help="Comma separated case names to run, e.g. path,fill.")
+
+    diff = subparsers.add_parser("compare", help="Compare two saved runs. Exits with 1 if anything got slower.")
+    diff.add_argument("before")
+    diff.add_argument("after")
+    diff.add_argument("--threshold", type=float, default=0.1, help="Slowdown that counts as a regression, 0.1 is 10%%.")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        only = None if args.filter is None else set(args.filter.split(','))
+        results = run_all(repeat=args.repeat, quick=args.quick, only=only)
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"{len(results['results'])} results saved to {args.out}.")
+    else:
+        with open(args.before) as f:
+            before = json.load(f)
+        with open(args.after) as f:
+            after = json.load(f)
+        regressions = compare(before, after, threshold=args.threshold)
+        print(f"{len(regressions)} case(s) slower by more than {args.threshold:.0%}.")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
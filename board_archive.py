@@ -0,0 +1,286 @@
+"""
+A packed file format for storing many boards in one file.
+
+The file starts with a header, followed by one fixed-size record per board:
+
+    header  magic b'JJBA', version, rows and columns every record has room for, record size, number of records,
+            bits per cell
+    record  rows, columns, max_distance, path length, board number, seed, difficulty,
+            the cells packed two to a byte (15 marks 'X'), or one signed byte each (-1 marks 'X') when the 
+            archive is made for distances of 15 or more, as every default board from 17x17 up is,
+            the path as cell indices i * columns + j, one uint16 each
+
+Because records are all the same size, BoardArchive can mmap the file and read board k straight from
+its offset without reading anything else.
+
+    python board_archive.py import boards/Hard hard.jjba
+    python board_archive.py export hard.jjba unpacked/Hard
+"""
+
+import argparse
+import glob
+import mmap
+import os
+import re
+import struct
+from array import array
+
+import numpy as np
+
+from logic import Board, GOAL
+
+
+MAGIC = b'JJBA'
+VERSION = 1
+HEADER = struct.Struct('<4sHHHIQB') # magic, version, m capacity, n capacity, record size, count, bits per cell
+RECORD = struct.Struct('<BBBHIQf') # m, n, max_distance, path length, number, seed, difficulty
+GOAL_NIBBLE = 15
+
+
+def record_size(m, n, cell_bits=4):
+    cells = m * n
+    return RECORD.size + (cells * cell_bits + 7) // 8 + 2 * cells
+
+
+def cell_bits(max_distance):
+    """
+    Bits each cell takes in an archive for boards with distances up to max_distance.
+    """
+    return 4 if max_distance < GOAL_NIBBLE else 8
+
+
+class ArchiveWriter:
+    """
+    Writes boards to a new archive one at a time, so a batch can be streamed to disk as it is made.
+    Every board has to fit in m x n and have no distance above max_distance, which defaults to the 
+    one an m x n Board gets. Use as a context manager, or call close() to finish the file.
+    """
+
+    def __init__(self, filename, m, n, max_distance=None):
+        self.m = m
+        self.n = n
+        self.max_distance = (m + n) // 2 - 2 if max_distance is None else max_distance
+        self.cell_bits = cell_bits(self.max_distance)
+        self.record_size = record_size(m, n, self.cell_bits)
+        self.count = 0
+        self.file = open(filename, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, m, n, self.record_size, 0, self.cell_bits))
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def add(self, board, number=None, seed=0, difficulty=None):
+        """
+        Appends a board. number defaults to the board's position in the archive and
+        difficulty to the difficulty_bias its path was made with.
+        """
+        if board.m > self.m or board.n > self.n:
+            raise ValueError(f"A {board.m}x{board.n} board does not fit in a {self.m}x{self.n} archive")
+
+        cells = np.frombuffer(board.cells, dtype=np.int8)
+        if cells.max(initial=0) > self.max_distance:
+            raise ValueError(f"Distances above {self.max_distance} can't be stored in this archive")
+
+        if self.cell_bits == 8:
+            packed = np.zeros(self.m * self.n, dtype=np.int8)
+            packed[:cells.size] = cells
+        else:
+            nibbles = np.zeros(2 * ((self.m * self.n + 1) // 2), dtype=np.uint8)
+            nibbles[:cells.size] = np.where(cells == GOAL, GOAL_NIBBLE, cells)
+            packed = (nibbles[0::2] << 4) | nibbles[1::2]
+
+        path = np.zeros(self.m * self.n, dtype='<u2')
+        path[:len(board.path)] = [i * board.n + j for i, j in board.path]
+
+        if number is None:
+            number = self.count
+        if difficulty is None:
+            difficulty = board.difficulty_bias
+
+        self.file.write(RECORD.pack(board.m, board.n, board.max_distance, len(board.path), number, seed, difficulty))
+        self.file.write(packed.tobytes())
+        self.file.write(path.tobytes())
+        self.count += 1
+
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.m, self.n, self.record_size, self.count, self.cell_bits))
+        self.file.close()
+
+
+class BoardArchive:
+    """
+    Read access to an archive through mmap. archive[k] is the k-th Board and archive.info(k)
+    its number, seed and difficulty, both read without touching any other record.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.m, self.n, self.record_size, self.count, self.cell_bits = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{filename} is not a board archive")
+        if version != VERSION:
+            raise ValueError(f"{filename} is version {version} of the archive format, expected {VERSION}")
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def __len__(self):
+        return self.count
+
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+
+    def offset(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError(f"Board {index} is not in an archive of {self.count} boards")
+        return HEADER.size + index * self.record_size
+
+
+    def info(self, index):
+        """
+        The metadata of a record as a dict.
+        """
+        m, n, max_distance, path_length, number, seed, difficulty = RECORD.unpack_from(self.mmap, self.offset(index))
+        return {
+            'm': m, 'n': n, 'max_distance': max_distance, 'path_length': path_length,
+            'number': number, 'seed': seed, 'difficulty': difficulty,
+        }
+
+
+    def __getitem__(self, index):
+        offset = self.offset(index)
+        m, n, max_distance, path_length, number, seed, difficulty = RECORD.unpack_from(self.mmap, offset)
+        offset += RECORD.size
+
+        capacity = self.m * self.n
+        if self.cell_bits == 8:
+            packed = np.frombuffer(self.mmap, dtype=np.int8, count=capacity, offset=offset)
+            cells = packed[:m * n]
+        else:
+            packed = np.frombuffer(self.mmap, dtype=np.uint8, count=(capacity + 1) // 2, offset=offset)
+            nibbles = np.empty(2 * packed.size, dtype=np.int8)
+            nibbles[0::2] = packed >> 4
+            nibbles[1::2] = packed & 15
+            cells = nibbles[:m * n]
+            cells[cells == GOAL_NIBBLE] = GOAL
+        offset += packed.size
+
+        path = np.frombuffer(self.mmap, dtype='<u2', count=path_length, offset=offset)
+
+        b = Board(m, n, max_distance=max_distance)
+        b.cells = array('b', cells.tobytes())
+        b.path = [(int(square) // n, int(square) % n) for square in path]
+        b.difficulty_bias = difficulty
+        return b
+
+
+    def close(self):
+        self.mmap.close()
+
+
+def write_archive(filename, boards, numbers=None, seeds=None, difficulties=None):
+    """
+    Writes a list of boards to a new archive with room for the largest of them and their largest distance.
+    """
+    m = max(b.m for b in boards)
+    n = max(b.n for b in boards)
+    max_distance = max(max(b.max_distance, max(b.cells)) for b in boards)
+    with ArchiveWriter(filename, m, n, max_distance=max_distance) as writer:
+        for index, b in enumerate(boards):
+            writer.add(
+                b,
+                number=None if numbers is None else numbers[index],
+                seed=0 if seeds is None else seeds[index],
+                difficulty=None if difficulties is None else difficulties[index],
+            )
+
+
+def read_folder(directory):
+    """
+    Reads every jumping_julia_board_k.txt in a folder, along with its path file if there is one.
+    Returns the boards in order of k, and the list of k.
+    """
+    numbers = sorted(
+        int(re.fullmatch(r'jumping_julia_board_(\d+)\.txt', os.path.basename(name)).group(1))
+        for name in glob.glob(os.path.join(directory, 'jumping_julia_board_*.txt'))
+    )
+
+    boards = []
+    for number in numbers:
+        path_filename = os.path.join(directory, f'jumping_julia_path_{number}.txt')
+        boards.append(Board.from_file(
+            os.path.join(directory, f'jumping_julia_board_{number}.txt'),
+            path_filename if os.path.exists(path_filename) else None,
+        ))
+
+    return boards, numbers
+
+
+def import_text(directory, filename):
+    """
+    Packs every jumping_julia_board_k.txt in a folder, along with its path file, into an archive.
+    Boards are stored in order of k and keep k as their number. Returns how many boards were packed.
+    """
+    boards, numbers = read_folder(directory)
+    write_archive(filename, boards, numbers=numbers, difficulties=[float('nan')] * len(boards))
+    return len(boards)
+
+
+def export_text(filename, directory):
+    """
+    Writes every board of an archive back out as jumping_julia_board_k.txt and jumping_julia_path_k.txt,
+    where k is the board's number.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with BoardArchive(filename) as archive:
+        for index in range(len(archive)):
+            number = archive.info(index)['number']
+            b = archive[index]
+            b.create_board_text_file(filename=os.path.join(directory, f'jumping_julia_board_{number}.txt'))
+            if b.path:
+                b.create_path_text_file(filename=os.path.join(directory, f'jumping_julia_path_{number}.txt'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack boards into an archive, or unpack one.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pack = subparsers.add_parser("import", help="Pack a folder of board and path text files into an archive.")
+    pack.add_argument("directory")
+    pack.add_argument("archive")
+
+    unpack = subparsers.add_parser("export", help="Write the boards of an archive out as text files.")
+    unpack.add_argument("archive")
+    unpack.add_argument("directory")
+
+    args = parser.parse_args()
+    if args.command == "import":
+        print(f'{import_text(args.directory, args.archive)} boards packed into {args.archive}.')
+    else:
+        export_text(args.archive, args.directory)
+
+
+if __name__ == "__main__":
+    main()
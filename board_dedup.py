@@ -0,0 +1,150 @@
+"""
+Canonical hashes of boards, and stores of the hashes already seen, for dropping duplicate boards from a
+batch as they are generated.
+
+A board and its transpose are the same puzzle: the start (0, 0) and the goal (m - 1, n - 1) stay where
+they are and every jump stays a jump of the same length. The canonical form of a board is whichever of
+the two has the smaller cells, and its hash is a blake2b digest of that form, so both hash the same.
+
+    seen = SeenBoards.open('seen.npz')   # empty if the file isn't there yet
+    if seen.add(board):                  # False for a board seen before
+        ...
+    seen.save('seen.npz')
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+
+def canonical_cells(board):
+    """
+    The (m, n, cells) of a board or of its transpose, whichever sorts first, with cells as bytes.
+    """
+    cells = np.frombuffer(board.cells, dtype=np.int8).reshape(board.m, board.n)
+    forms = [(board.m, board.n, cells.tobytes()), (board.n, board.m, cells.T.tobytes())]
+    return min(forms)
+
+
+def board_hash(board, bits=64):
+    """
+    Hash of the canonical form of a board as an int of 64 or 128 bits.
+    """
+    m, n, cells = canonical_cells(board)
+    digest = hashlib.blake2b(bytes([m, n]) + cells, digest_size=bits // 8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class SeenBoards:
+    """
+    Exact set of the hashes of every board seen. With 64 bit hashes a false duplicate is very unlikely
+    below billions of boards, and each board costs 8 bytes on disk.
+    """
+
+    def __init__(self, bits=64):
+        self.bits = bits
+        self.hashes = set()
+
+
+    def __len__(self):
+        return len(self.hashes)
+
+
+    def __contains__(self, board):
+        return board_hash(board, self.bits) in self.hashes
+
+
+    def add(self, board, key=None):
+        """
+        Adds a board, or its hash given as key. Returns False if it was already there.
+        """
+        key = board_hash(board, self.bits) if key is None else key
+        if key in self.hashes:
+            return False
+        self.hashes.add(key)
+        return True
+
+
+    def save(self, filename):
+        words = self.bits // 64
+        packed = np.array([[key >> (64 * w) & (2 ** 64 - 1) for w in range(words)] for key in self.hashes], dtype=np.uint64)
+        np.savez(filename, kind='set', bits=self.bits, hashes=packed.reshape(-1, words))
+
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            if str(data['kind']) == 'bloom':
+                return BloomFilter.load(filename)
+            seen = cls(bits=int(data['bits']))
+            for row in data['hashes'].tolist():
+                seen.hashes.add(sum(word << (64 * w) for w, word in enumerate(row)))
+        return seen
+
+
+    @classmethod
+    def open(cls, filename, bits=64):
+        """
+        The store saved in filename, whether a SeenBoards or a BloomFilter, or a new empty set if there is no such file.
+        """
+        if os.path.exists(filename):
+            return cls.load(filename)
+        return cls(bits=bits)
+
+
+class BloomFilter:
+    """
+    Fixed size stand-in for SeenBoards when a corpus is too big to keep every hash: about 1.2 bytes per
+    board for a 1% false positive rate, whatever the number of boards. A false positive drops a board that
+    was new, a real duplicate is never kept. Each board's k bit positions come from its 128 bit hash.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(64, int(-capacity * np.log(error_rate) / np.log(2) ** 2))
+        self.probes = max(1, round(self.size / capacity * np.log(2)))
+        self.filter = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self.bits = 128 # Of the board hashes it takes
+        self.count = 0
+
+
+    def __len__(self):
+        return self.count
+
+
+    def positions(self, key):
+        low, high = key & (2 ** 64 - 1), key >> 64
+        return [(low + probe * high) % self.size for probe in range(self.probes)]
+
+
+    def __contains__(self, board):
+        return all(self.filter[p >> 3] >> (p & 7) & 1 for p in self.positions(board_hash(board, 128)))
+
+
+    def add(self, board, key=None):
+        """
+        Adds a board, or its 128 bit hash given as key. Returns False if it was probably already there.
+        """
+        key = board_hash(board, 128) if key is None else key
+        new = False
+        for p in self.positions(key):
+            if not self.filter[p >> 3] >> (p & 7) & 1:
+                self.filter[p >> 3] |= 1 << (p & 7)
+                new = True
+        self.count += new
+        return new
+
+
+    def save(self, filename):
+        np.savez(filename, kind='bloom', capacity=self.capacity, error_rate=self.error_rate, count=self.count, filter=self.filter)
+
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            bloom = cls(int(data['capacity']), float(data['error_rate']))
+            bloom.filter = data['filter']
+            bloom.count = int(data['count'])
+        return bloom
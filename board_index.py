@@ -0,0 +1,141 @@
+"""
+Nearest neighbour lookups over tile histograms, for finding the boards in a corpus that look like a
+given board or like a target mix of tiles.
+
+    index = BoardIndex(max_tile=5)
+    index.add(tile_histograms(boards), ids=range(len(boards)))
+    index.query([10, 8, 6, 6, 5], k=5)   # [(id, distance), ...] closest first
+    index.save('boards.idx.npz')
+"""
+
+import numpy as np
+
+from custom_board_finder import tile_histograms
+
+
+class BoardIndex:
+    """
+    Index of board histograms under L1 distance. Every histogram goes into a bucket on a coarse grid,
+    its counts divided by bucket_width. A query works out the smallest distance anything in each bucket
+    could have, visits the buckets nearest first and stops as soon as that bound is further than the
+    k-th best board found, so only a handful of buckets are ever compared in full. Boards can be added
+    at any time, and boards with exactly the same histogram are found with one dict lookup.
+    """
+
+    def __init__(self, max_tile=5, bucket_width=4):
+        self.max_tile = max_tile
+        self.bucket_width = bucket_width
+
+        self.features = np.zeros((0, max_tile), dtype=np.uint16) # Has room for more than count rows.
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.count = 0
+
+        self.buckets = {} # Bucket key -> rows of the histograms in it
+        self.bucket_keys = [] # Keys in the order the buckets were made
+        self.key_array = None # bucket_keys as an array, rebuilt when a bucket is added
+        self.exact = {} # Histogram bytes -> rows with that histogram
+
+
+    def __len__(self):
+        return self.count
+
+
+    def add(self, features, ids=None):
+        """
+        Adds a (boards, max_tile) array of histograms. ids are the board IDs to report back from queries,
+        by default the boards' positions in the index.
+        """
+        features = np.asarray(features, dtype=np.uint16).reshape(-1, self.max_tile)
+        if ids is None:
+            ids = np.arange(self.count, self.count + len(features))
+        ids = np.asarray(ids, dtype=np.int64)
+
+        if self.count + len(features) > len(self.features):
+            capacity = max(2 * len(self.features), self.count + len(features), 1024)
+            self.features = np.resize(self.features, (capacity, self.max_tile))
+            self.ids = np.resize(self.ids, capacity)
+
+        rows = np.arange(self.count, self.count + len(features))
+        self.features[rows] = features
+        self.ids[rows] = ids
+        self.count += len(features)
+
+        for row, key, histogram in zip(rows.tolist(), map(tuple, (features // self.bucket_width).tolist()), features):
+            if key not in self.buckets:
+                self.buckets[key] = []
+                self.bucket_keys.append(key)
+                self.key_array = None
+            self.buckets[key].append(row)
+            self.exact.setdefault(histogram.tobytes(), []).append(row)
+
+
+    def add_boards(self, boards, ids=None):
+        """
+        Adds Board objects, working out their histograms first.
+        """
+        self.add(tile_histograms(np.stack([np.frombuffer(b.cells, dtype=np.int8) for b in boards]), max_tile=self.max_tile), ids=ids)
+
+
+    def duplicates(self, histogram):
+        """
+        IDs of the boards with exactly this histogram.
+        """
+        histogram = np.asarray(histogram, dtype=np.uint16)
+        return self.ids[self.exact.get(histogram.tobytes(), [])].tolist()
+
+
+    def query(self, histogram, k=5):
+        """
+        The k boards with histograms closest to the given one, as (id, distance) pairs closest first.
+        """
+        histogram = np.asarray(histogram, dtype=np.int32)
+        if self.count == 0:
+            return []
+
+        if self.key_array is None:
+            self.key_array = np.array(self.bucket_keys, dtype=np.int32).reshape(-1, self.max_tile)
+
+        # Smallest distance from the histogram to anything that could be in each bucket.
+        low = self.key_array * self.bucket_width
+        high = low + self.bucket_width - 1
+        bounds = (np.maximum(low - histogram, 0) + np.maximum(histogram - high, 0)).sum(axis=1)
+        order = np.argsort(bounds, kind='stable')
+
+        best_rows = np.zeros(0, dtype=np.int64)
+        best_distances = np.zeros(0, dtype=np.int32)
+        for bucket in order.tolist():
+            if len(best_rows) == k and bounds[bucket] > best_distances[-1]:
+                break
+
+            rows = np.array(self.buckets[self.bucket_keys[bucket]])
+            distances = np.abs(self.features[rows].astype(np.int32) - histogram).sum(axis=1)
+
+            best_rows = np.concatenate([best_rows, rows])
+            best_distances = np.concatenate([best_distances, distances])
+            keep = np.argsort(best_distances, kind='stable')[:k]
+            best_rows, best_distances = best_rows[keep], best_distances[keep]
+
+        return list(zip(self.ids[best_rows].tolist(), best_distances.tolist()))
+
+
+    def query_board(self, board, k=5):
+        """
+        The k boards in the index most like a Board.
+        """
+        histogram = tile_histograms(np.frombuffer(board.cells, dtype=np.int8)[None, :], max_tile=self.max_tile)[0]
+        return self.query(histogram, k=k)
+
+
+    def save(self, filename):
+        np.savez(
+            filename, features=self.features[:self.count], ids=self.ids[:self.count],
+            max_tile=self.max_tile, bucket_width=self.bucket_width,
+        )
+
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            index = cls(max_tile=int(data['max_tile']), bucket_width=int(data['bucket_width']))
+            index.add(data['features'], ids=data['ids'])
+        return index
@@ -0,0 +1,196 @@
+"""
+Builds the puzzle site into one folder that can be served as it is.
+
+Every board, its path and the links to its images go into a single gzipped manifest, so the page loads
+once and shows any puzzle without another request. Every image is written as WebP at a few widths plus
+a PNG fallback, with a hash of its contents in the filename so the files can be cached forever.
+
+    python build_site.py                                   # boards/Easy, boards/Medium, boards/Hard -> site/
+    python build_site.py --archive Corpus=corpus.jjba      # adds a difficulty read from a board archive
+"""
+
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+import rendering
+from board_archive import BoardArchive, read_folder
+
+
+DIFFICULTIES = ['Easy', 'Medium', 'Hard'] # Folders of boards/ in the order the page lists them.
+WIDTHS = [480, 960] # Widths of the WebP images, in pixels.
+STATIC_FILES = ['index.html', 'script.js']
+
+
+WEBP_OPTIONS = [dict(lossless=True, quality=50, method=4), dict(quality=85, method=4)] # method 6 is ~30x slower for a few percent
+
+
+def board_text(board):
+    return "".join(" ".join(str(x) for x in row) + '\n' for row in board.board)
+
+
+def encode(image, fmt, choices):
+    """
+    Encodes an image with each set of save options in choices and returns the smallest result.
+    """
+    best = None
+    for options in choices:
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt, **options)
+        if best is None or buffer.tell() < len(best):
+            best = buffer.getvalue()
+    return best
+
+
+def write_hashed(data, out, stem, extension):
+    """
+    Writes encoded image data to out/img/stem.hash.extension, hashing the data itself, and
+    returns the filename relative to out.
+    """
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    filename = f'img/{stem}.{digest}.{extension}'
+    path = os.path.join(out, filename)
+    if not os.path.exists(path):
+        with open(path, 'wb') as f:
+            f.write(data)
+    return filename
+
+
+def resized(image, width):
+    if width >= image.width:
+        return image
+    return image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+
+
+def image_variants(image, out, stem, png=None):
+    """
+    Writes the WebP widths, never enlarging the image, and a full size PNG fallback. png is the
+    PNG the image was read from, if any, which is copied as it is rather than encoded again. Each WebP is
+    lossless or lossy, whichever is smaller, and a narrower one is only kept if it is also smaller 
+    in bytes than the wider ones. The flat colours of a full size board compress so well losslessly 
+    that scaling it down often makes the file bigger. Returns
+    {'webp': [[filename, width], ...], 'png': filename, 'width': w, 'height': h}.
+    """
+    variants = {'webp': [], 'width': image.width, 'height': image.height}
+    smallest = None
+    for width in sorted({min(width, image.width) for width in WIDTHS}, reverse=True):
+        data = encode(resized(image, width), 'WEBP', WEBP_OPTIONS)
+        if smallest is None or len(data) < smallest:
+            smallest = len(data)
+            variants['webp'].insert(0, [write_hashed(data, out, stem, 'webp'), width])
+
+    if png is None:
+        png = encode(image, 'PNG', [dict(optimize=True)])
+    variants['png'] = write_hashed(png, out, stem, 'png')
+    return variants
+
+
+def build_entry(job):
+    """
+    The manifest entry of one board, writing its images on the way. Images already next to the
+    board's text files are used as they are, any others are rendered. Runs in a worker process.
+    """
+    board, number, key, board_image, solution_image, out = job
+
+    if board_image is not None and solution_image is not None:
+        pngs = []
+        for filename in (board_image, solution_image):
+            with open(filename, 'rb') as f:
+                pngs.append(f.read())
+        images = [Image.open(io.BytesIO(png)).convert('RGB') for png in pngs]
+    else:
+        pngs = [None, None]
+        images = rendering.default_renderer().render_pair(board)
+
+    return {
+        'number': number,
+        'm': board.m,
+        'n': board.n,
+        'board': board_text(board),
+        'path': [list(square) for square in board.path],
+        'images': {
+            'board': image_variants(images[0], out, f'{key}_board_{number}', png=pngs[0]),
+            'solution': image_variants(images[1], out, f'{key}_solution_{number}', png=pngs[1]),
+        },
+    }
+
+
+def folder_jobs(directory, key, out):
+    boards, numbers = read_folder(directory)
+    jobs = []
+    for b, number in zip(boards, numbers):
+        board_image = os.path.join(directory, f'jumping_julia_board_{number}.png')
+        solution_image = os.path.join(directory, f'jumping_julia_solution_{number}.png')
+        if not (os.path.exists(board_image) and os.path.exists(solution_image)):
+            board_image = solution_image = None
+        jobs.append((b, number, key, board_image, solution_image, out))
+    return jobs
+
+
+def archive_jobs(filename, key, out):
+    with BoardArchive(filename) as archive:
+        return [(archive[index], archive.info(index)['number'], key, None, None, out) for index in range(len(archive))]
+
+
+def build(sources, out='site', workers=None):
+    """
+    Builds the site from sources, a list of (name, kind, location) where kind is 'folder' or 'archive'.
+    Writes out/manifest.json.gz (and an uncompressed copy), the images under out/img and the page itself.
+    Returns the manifest.
+    """
+    os.makedirs(os.path.join(out, 'img'), exist_ok=True)
+
+    manifest = {'version': 1, 'difficulties': []}
+    for name, kind, location in sources:
+        key = name.lower()
+        jobs = folder_jobs(location, key, out) if kind == 'folder' else archive_jobs(location, key, out)
+
+        if workers == 1:
+            puzzles = list(map(build_entry, jobs))
+        else:
+            with ProcessPoolExecutor(workers) as executor:
+                puzzles = list(executor.map(build_entry, jobs, chunksize=max(1, len(jobs) // 32)))
+
+        manifest['difficulties'].append({'key': key, 'name': name, 'puzzles': puzzles})
+
+    data = json.dumps(manifest, separators=(',', ':')).encode()
+    with open(os.path.join(out, 'manifest.json'), 'wb') as f:
+        f.write(data)
+    with gzip.GzipFile(os.path.join(out, 'manifest.json.gz'), 'wb', compresslevel=9, mtime=0) as f:
+        f.write(data)
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    for filename in STATIC_FILES:
+        shutil.copyfile(os.path.join(here, filename), os.path.join(out, filename))
+
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the puzzle site: one manifest and cacheable images.")
+    parser.add_argument("--boards", default="boards", help="Folder with one subfolder of boards per difficulty.")
+    parser.add_argument("--archive", action="append", default=[], metavar="NAME=FILE", help="Add a difficulty read from a board archive.")
+    parser.add_argument("--out", default="site")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    sources = [(name, 'folder', os.path.join(args.boards, name)) for name in DIFFICULTIES if os.path.isdir(os.path.join(args.boards, name))]
+    for spec in args.archive:
+        name, filename = spec.split('=', 1)
+        sources.append((name, 'archive', filename))
+
+    manifest = build(sources, out=args.out, workers=args.workers)
+    count = sum(len(d['puzzles']) for d in manifest['difficulties'])
+    size = os.path.getsize(os.path.join(args.out, 'manifest.json.gz'))
+    print(f'{count} puzzles built into {args.out}/, manifest {size / 1024:.1f} KiB gzipped.')
+
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,213 @@
 import pickle
-from collections import Counter
+import time
 import numpy as np
 
 
 NUMBER_OF_BOARDS = 300
+MAX_TILE = 5
 
 
-boards = []
-board_counters = []
-for seed in range(NUMBER_OF_BOARDS):
-    with open(f'debugging_boards/pickle_{seed}.pkl', 'rb') as f:
-        board = pickle.load(f)
-        boards.append(board)
-        board_counter = Counter(cell for row in board for cell in row)
-        board_counters.append(np.array([board_counter[tile] for tile in range(1, 6)]))
+def load_pickled_boards(number_of_boards, folder='debugging_boards'):
+    """
+    Loads the pickled boards from logic.py into one (number_of_boards, cells) array, with 'X' as 0.
+    """
+    boards = []
+    for seed in range(number_of_boards):
+        with open(f'{folder}/pickle_{seed}.pkl', 'rb') as f:
+            board = pickle.load(f)
+            boards.append([cell if type(cell) == int else 0 for row in board for cell in row])
+    return np.array(boards, dtype=np.int8)
+
+
+def load_archived_boards(filename):
+    """
+    Loads every board of a board_archive file into one (boards, cells) array. The boards must all be the same size.
+    """
+    from board_archive import BoardArchive
+
+    with BoardArchive(filename) as archive:
+        return np.stack([np.frombuffer(b.cells, dtype=np.int8) for b in archive])
+
+
+def tile_histograms(boards, max_tile=MAX_TILE, dtype=np.uint16):
+    """
+    How many times each tile 1..max_tile appears on each board, for a (boards, cells) array, in one pass.
+    Row k of the result is the histogram of board k.
+    """
+    boards = np.asarray(boards)
+    tiles = (boards >= 1) & (boards <= max_tile)
+    board_index = np.nonzero(tiles)[0]
+    counts = np.bincount(board_index * max_tile + boards[tiles] - 1, minlength=len(boards) * max_tile)
+    return counts.reshape(len(boards), max_tile).astype(dtype)
 
 
 def distance_between_boards(b1, b2):
     return sum(abs(b1 - b2))
 
 
-distance_matrix = np.zeros((NUMBER_OF_BOARDS, NUMBER_OF_BOARDS))
-for i, b1 in enumerate(board_counters):
-    for j, b2 in enumerate(board_counters):
-        distance_matrix[i, j] = distance_between_boards(b1, b2)
+def l1_block(a, b, dtype=np.uint16):
+    """
+    L1 distances between every row of a and every row of b, one tile at a time to keep memory down.
+    """
+    out = np.zeros((len(a), len(b)), dtype=np.int32)
+    for tile in range(a.shape[1]):
+        out += np.abs(a[:, tile, None].astype(np.int32) - b[None, :, tile].astype(np.int32))
+    return out.astype(dtype)
+
+
+def distance_blocks(features, block_size=2048, dtype=np.uint16):
+    """
+    Yields (i, j, block) for the blocks of the pairwise L1 distance matrix on or above the diagonal,
+    where block holds the distances between rows i:i + block_size and j:j + block_size. The full
+    matrix is never held in memory.
+    """
+    for i in range(0, len(features), block_size):
+        for j in range(i, len(features), block_size):
+            yield i, j, l1_block(features[i:i + block_size], features[j:j + block_size], dtype=dtype)
+
+
+def distance_matrix(features, block_size=2048, dtype=np.uint16):
+    """
+    The full pairwise L1 distance matrix, filled in block by block.
+    """
+    matrix = np.zeros((len(features), len(features)), dtype=dtype)
+    for i, j, block in distance_blocks(features, block_size=block_size, dtype=dtype):
+        matrix[i:i + block.shape[0], j:j + block.shape[1]] = block
+        matrix[j:j + block.shape[1], i:i + block.shape[0]] = block.T
+    return matrix
+
+
+def close_pair_blocks(features, max_distance, block_size=2048):
+    """
+    Yields (rows, columns, distances) arrays, one set per block, covering every pair of boards 
+    i < j whose histograms are less than max_distance apart.
+    """
+    for i, j, block in distance_blocks(features, block_size=block_size):
+        rows, columns = np.nonzero(block < max_distance)
+        distances = block[rows, columns]
+        rows, columns = rows + i, columns + j
+        upper = rows < columns
+        yield rows[upper], columns[upper], distances[upper]
+
+
+def close_pairs(features, max_distance, block_size=2048):
+    """
+    Yields (i, j, distance) for every pair of boards i < j whose histograms are less than max_distance apart,
+    without building the distance matrix.
+    """
+    for rows, columns, distances in close_pair_blocks(features, max_distance, block_size=block_size):
+        yield from zip(rows.tolist(), columns.tolist(), distances.tolist())
+
+
+def similarity_graph(features, max_distance, block_size=2048):
+    """
+    The graph joining every two boards less than max_distance apart, as sorted neighbour lists: 
+    the neighbours of board k are indices[indptr[k]:indptr[k + 1]].
+    """
+    pairs = list(close_pair_blocks(features, max_distance, block_size=block_size))
+    rows = np.concatenate([r for r, c, d in pairs] + [c for r, c, d in pairs]).astype(np.int64)
+    columns = np.concatenate([c for r, c, d in pairs] + [r for r, c, d in pairs]).astype(np.int64)
+
+    order = np.lexsort((columns, rows))
+    indices = columns[order]
+    indptr = np.zeros(len(features) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(features)), out=indptr[1:])
+    return indptr, indices
+
+
+def grow_clique(seed, neighbors, indptr, indices, k=None):
+    """
+    Greedily grows a set of mutually close boards around seed out of its neighbours. Adjacency among
+    the neighbours is kept as one bitset per neighbour, and every pick cuts the candidates down to
+    the ones close to everything chosen so far, always taking the candidate that keeps the most.
+    """
+    bitsets = []
+    for u in neighbors:
+        close = np.isin(neighbors, indices[indptr[u]:indptr[u + 1]], assume_unique=True)
+        bitsets.append(int.from_bytes(np.packbits(close, bitorder='little').tobytes(), 'little'))
+
+    chosen = [int(seed)]
+    candidates = (1 << len(neighbors)) - 1
+    while candidates and (k is None or len(chosen) < k):
+        best, best_left = None, -1
+        bits = candidates
+        while bits:
+            low = bits & -bits
+            v = low.bit_length() - 1
+            left = (bitsets[v] & candidates).bit_count()
+            if left > best_left:
+                best, best_left = v, left
+            bits ^= low
+
+        chosen.append(int(neighbors[best]))
+        candidates &= bitsets[best]
+
+    return chosen
+
+
+def select_similar(features, max_distance, k=None, seeds=None, time_budget=None, graph=None, block_size=2048):
+    """
+    Finds a set of boards whose histograms are all less than max_distance apart from each other, 
+    stopping at k boards if k is given. Sets are grown from the boards in seeds, by default every 
+    board with the best connected first, until one reaches k, no remaining seed could do better or 
+    time_budget seconds have passed. Returns the largest set found.
+    The similarity_graph for max_distance can be passed in as graph to reuse it between calls, 
+    time_budget does not include building it.
+    """
+    if graph is None:
+        graph = similarity_graph(features, max_distance, block_size=block_size)
+    indptr, indices = graph
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    degree = np.diff(indptr)
+    if seeds is None:
+        seeds = np.argsort(-degree, kind='stable')
+
+    best = []
+    for seed in seeds:
+        if k is not None and len(best) >= k:
+            break
+        if degree[seed] + 1 <= len(best):
+            continue
+
+        chosen = grow_clique(seed, indices[indptr[seed]:indptr[seed + 1]], indptr, indices, k=k)
+        if len(chosen) > len(best):
+            best = chosen
 
+        if deadline is not None and time.perf_counter() > deadline:
+            break
 
-def find_maximal_set(adj_matrix, prefered_node_index, max_distance):
-    # Initialize an empty set to hold the maximal set of nodes
-    maximal_set = [prefered_node_index]
+    return best
 
-    # Get the number of nodes
-    num_nodes = adj_matrix.shape[0]
 
-    # Iterate through each node
-    for node in range(num_nodes):
-        if node == prefered_node_index:
-            continue
+def select_diverse(features, k, min_distance=None, start=0):
+    """
+    Picks up to k boards that are spread out, by repeatedly taking the board furthest from everything 
+    picked so far (the greedy k-center heuristic). Stops early once the next board would be less than 
+    min_distance from one already picked. O(len(features) * k).
+    """
+    features = np.asarray(features, dtype=np.int32)
+    chosen = [start]
+    closest = np.abs(features - features[start]).sum(axis=1)
+    while len(chosen) < k:
+        furthest = int(closest.argmax())
+        if closest[furthest] == 0 or (min_distance is not None and closest[furthest] < min_distance):
+            break
+        chosen.append(furthest)
+        closest = np.minimum(closest, np.abs(features - features[furthest]).sum(axis=1))
 
-        # Assume the node can be added to the maximal set
-        can_add = True
+    return chosen
 
-        # Check if this node is compatible with the current set
-        for selected_node in maximal_set:
-            if adj_matrix[node, selected_node] >= max_distance:
-                can_add = False
-                break
-        
-        # If compatible, add the node to the maximal set
-        if can_add:
-            maximal_set.append(node)
 
-    return maximal_set
+if __name__ == "__main__":
+    boards = load_pickled_boards(NUMBER_OF_BOARDS)
+    board_counters = tile_histograms(boards)
 
+    graph = similarity_graph(board_counters, max_distance=6)
 
+    # Find the maximal set of nodes
+    for pref_node in range(NUMBER_OF_BOARDS):
+        maximal_nodes = select_similar(board_counters, max_distance=6, seeds=[pref_node], graph=graph)
+        if len(maximal_nodes) > 8:
+            print(f"Number of nodes in the maximal set for {pref_node}: {len(maximal_nodes)} -- {maximal_nodes}")
 
-# Find the maximal set of nodes
-for pref_node in range(NUMBER_OF_BOARDS):
-    maximal_nodes = find_maximal_set(distance_matrix, prefered_node_index=pref_node, max_distance=6)
-    if len(maximal_nodes) > 8:
-        print(f"Number of nodes in the maximal set for {pref_node}: {len(maximal_nodes)} -- {maximal_nodes}")
+    print(f"Largest set: {select_similar(board_counters, max_distance=6, time_budget=10, graph=graph)}")
@@ -0,0 +1,190 @@
+"""
+Difficulty measured from the boards themselves rather than from the difficulty_bias they were made with.
+
+Every board's jump graph is searched once forwards from the start and once backwards from 'X', and the
+numbers below are kept in a DifficultyIndex, one array per column and one row per board ID, so boards can be
+sorted and binned without solving anything again.
+
+    python difficulty.py boards/Hard --out hard_difficulty.npz
+    python difficulty.py --archive corpus.jjba --out corpus_difficulty.npz
+"""
+
+import argparse
+from multiprocessing import Pool
+
+import numpy as np
+
+from board_archive import BoardArchive, read_folder
+
+
+DISTANCE_BINS = 16 # Squares more than DISTANCE_BINS - 2 jumps from 'X' share the second to last bin, unreachable ones the last.
+
+COLUMNS = {
+    'solution_length': np.int16, # Jumps in the shortest solution, -1 if there is none
+    'shortest_solutions': np.uint8, # Number of shortest solutions, counting up to 2. Longer ones are not counted.
+    'unique': np.bool_, # The shortest solution is the only route to 'X' of any length
+    'reachable': np.uint16, # Squares that can be reached from the start
+    'dead_ends': np.uint16, # Reachable squares from which 'X' can't be reached
+    'decoys': np.uint16, # Squares off the solution that a square on it can jump to
+    'branching': np.float32, # Average number of squares each square of the solution can jump to
+    'mean_to_goal': np.float32, # Average number of jumps to 'X' over the reachable squares that can get there
+}
+
+
+def analyze(board):
+    """
+    Difficulty numbers for one board, as a dict with a value for every column in COLUMNS
+    plus 'to_goal', the number of reachable squares at each distance from 'X'.
+    """
+    jumps = board.jumps
+    cells = board.cells
+    from_start, count, parent = board.search_from_start(cap=2, stop_at_goal=False)
+    to_goal = board.search_to_goal()
+
+    solution = []
+    square = jumps.goal if from_start[jumps.goal] >= 0 else -1
+    while square >= 0:
+        solution.append(square)
+        square = parent[square]
+    on_solution = set(solution)
+
+    # Whether the solution found is the only one is checked with it standing in for the board's own path.
+    path = board.path
+    board.path = [jumps.coords[square] for square in reversed(solution)]
+    try:
+        unique = board.path_is_only_solution()
+    finally:
+        board.path = path
+
+    decoys = set()
+    moves = 0
+    for square in solution:
+        distance = cells[square]
+        if not 0 < distance < jumps.stride:
+            continue
+        targets = jumps.both[square * jumps.stride + distance]
+        moves += len(targets)
+        decoys.update(target for target in targets if target not in on_solution)
+
+    from_start = np.frombuffer(from_start, dtype=np.int32)
+    to_goal = np.frombuffer(to_goal, dtype=np.int32)
+    reachable = from_start >= 0
+    finishing = reachable & (to_goal >= 0)
+
+    to_goal_counts = np.bincount(np.minimum(to_goal[finishing], DISTANCE_BINS - 2), minlength=DISTANCE_BINS)
+    to_goal_counts[-1] = int((reachable & (to_goal < 0)).sum())
+
+    return {
+        'solution_length': len(solution) - 1,
+        'shortest_solutions': count[jumps.goal],
+        'unique': unique,
+        'reachable': int(reachable.sum()),
+        'dead_ends': int((reachable & (to_goal < 0)).sum()),
+        'decoys': len(decoys),
+        'branching': moves / (len(solution) - 1) if len(solution) > 1 else 0.0,
+        'mean_to_goal': float(to_goal[finishing].mean()) if finishing.any() else 0.0,
+        'to_goal': to_goal_counts,
+    }
+
+
+class DifficultyIndex:
+    """
+    Difficulty numbers for many boards, stored column by column. index['decoys'] is the array of
+    one column, index.row(board_id) the numbers for one board.
+    """
+
+    def __init__(self, ids, columns, to_goal):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.columns = columns
+        self.to_goal = to_goal # (boards, DISTANCE_BINS) counts of squares by distance to 'X'
+        self.rows = {board_id: row for row, board_id in enumerate(self.ids.tolist())}
+
+
+    @classmethod
+    def build(cls, boards, ids=None, workers=None):
+        """
+        Analyzes a list of boards over a process pool. workers=1 analyzes them in this process.
+        """
+        if ids is None:
+            ids = range(len(boards))
+
+        if workers == 1:
+            results = list(map(analyze, boards))
+        else:
+            with Pool(workers) as pool:
+                results = pool.map(analyze, boards, chunksize=max(1, len(boards) // 64))
+
+        columns = {name: np.array([r[name] for r in results], dtype=dtype) for name, dtype in COLUMNS.items()}
+        to_goal = np.array([r['to_goal'] for r in results], dtype=np.uint16).reshape(len(results), DISTANCE_BINS)
+        return cls(ids, columns, to_goal)
+
+
+    def __len__(self):
+        return len(self.ids)
+
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+
+    def row(self, board_id):
+        row = self.rows[board_id]
+        out = {name: values[row].item() for name, values in self.columns.items()}
+        out['to_goal'] = self.to_goal[row].tolist()
+        return out
+
+
+    def sort_by(self, column, descending=False):
+        """
+        Board IDs in order of one column.
+        """
+        order = np.argsort(self.columns[column], kind='stable')
+        if descending:
+            order = order[::-1]
+        return self.ids[order].tolist()
+
+
+    def bin(self, column, edges, unique_only=False):
+        """
+        Splits the boards by one column at the given edges, e.g. bin('solution_length', [8, 12]) gives
+        three lists of board IDs: below 8, from 8 up to 12, and 12 or more. With unique_only, boards
+        with more than one solution are left out of every bin.
+        """
+        which = np.digitize(self.columns[column], edges)
+        if unique_only:
+            which[~self.columns['unique']] = -1
+        return [self.ids[which == k].tolist() for k in range(len(edges) + 1)]
+
+
+    def save(self, filename):
+        np.savez(filename, ids=self.ids, to_goal=self.to_goal, **self.columns)
+
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            return cls(data['ids'], {name: data[name] for name in COLUMNS}, data['to_goal'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Work out how hard boards are and save it as an index.")
+    parser.add_argument("directory", nargs="?", help="Folder of jumping_julia_board_k.txt files.")
+    parser.add_argument("--archive", default=None, help="Read the boards from a board archive instead.")
+    parser.add_argument("--out", required=True, help="Where to save the index (.npz).")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.archive is not None:
+        with BoardArchive(args.archive) as archive:
+            boards = list(archive)
+            ids = [archive.info(index)['number'] for index in range(len(archive))]
+    else:
+        boards, ids = read_folder(args.directory)
+
+    index = DifficultyIndex.build(boards, ids=ids, workers=args.workers)
+    index.save(args.out)
+    print(f'{len(index)} boards analyzed. Hardest by solution length: {index.sort_by("solution_length", descending=True)[:10]}')
+
+
+if __name__ == "__main__":
+    main()
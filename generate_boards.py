@@ -0,0 +1,198 @@
+"""
+Generates a batch of boards over a process pool and writes them out as they finish, in the same
+layout as boards/. Every board is made from its own seed, worked out from the base seed and the
+board's index, so the files written do not depend on the number of workers. With --dedup, boards
+already made in this batch or in an earlier one (or their transposes) are dropped before anything of
+them is written.
+
+    python generate_boards.py 8 8 --count 500 --seed 42 --difficulty-bias 0.25 --workers 8 --out generated --render
+    python generate_boards.py 6 6 --count 5000 --max-distance 5 --dedup seen.npz --archive small.jjba
+"""
+
+import argparse
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from board_archive import ArchiveWriter
+from board_dedup import BloomFilter, SeenBoards, board_hash
+from logic import Board, GenerationError, GenerationStats
+
+
+def board_seed(base_seed, index):
+    """
+    Seed for the board with the given index in a batch.
+    """
+    return int(np.random.SeedSequence([base_seed, index]).generate_state(1)[0])
+
+
+def write_board(b, index, out, render, archive):
+    """
+    Writes the text files of a board, unless it is going into an archive, and its images if render is set.
+    Returns the seconds spent rendering.
+    """
+    if not archive:
+        b.create_board_text_file(filename=os.path.join(out, f"jumping_julia_board_{index}.txt"))
+        b.create_path_text_file(filename=os.path.join(out, f"jumping_julia_path_{index}.txt"))
+    if render:
+        rendered = b.stats.times.get('render', 0.0)
+        b.create_board_images(
+            board_filename=os.path.join(out, f"jumping_julia_board_{index}.png"),
+            solution_filename=os.path.join(out, f"jumping_julia_solution_{index}.png"),
+        )
+        return b.stats.times['render'] - rendered
+    return 0.0
+
+
+def make_board(task):
+    """
+    Generates the board for one index of the batch and writes its files. Runs in a worker process.
+    Returns the index, the reason the board was skipped if it ran out of budget, the board and 
+    its seed if it is going into an archive instead of text files, the board's GenerationStats and
+    its hash. If hash_bits is set the board is only hashed, not written, and always sent back, so
+    the main process can check it for duplicates first.
+    """
+    index, m, n, max_distance, difficulty_bias, base_seed, out, render, max_restarts, max_backtracks, timeout, archive, guided, hash_bits = task
+
+    seed = board_seed(base_seed, index)
+    b = Board(m, n, max_distance=max_distance, seed=seed)
+    deadline = None if timeout is None else time.perf_counter() + timeout # One budget for the path and the fill together
+    try:
+        b.create_random_path(
+            difficulty_bias=difficulty_bias, max_restarts=max_restarts, max_backtracks=max_backtracks, timeout=timeout, guided=guided,
+        )
+        b.fill_remaining_squares(
+            restart_for_zeros=True, max_restarts=max_restarts, max_backtracks=max_backtracks,
+            timeout=None if deadline is None else max(deadline - time.perf_counter(), 0),
+        )
+    except GenerationError as e:
+        return index, str(e), None, seed, b.stats, None
+
+    if hash_bits is not None:
+        return index, None, b, seed, b.stats, board_hash(b, hash_bits)
+
+    write_board(b, index, out, render, archive)
+    return index, None, b if archive else None, seed, b.stats, None
+
+
+def generate(
+    m, n, count, seed=0, max_distance=None, difficulty_bias=0.25, out="generated", render=False, 
+    workers=None, start=1, max_restarts=None, max_backtracks=None, timeout=None, archive=None, report_every=10, guided=False, seen=None,
+):
+    """
+    Generates count boards numbered from start into the folder out, reporting progress and
+    throughput as they come in. workers=None uses every core and workers=1 runs in this process.
+    Boards that need more than max_restarts restarts, max_backtracks backtracks for one path or 
+    timeout seconds are skipped and reported. If archive is a filename the boards and paths go into 
+    that board_archive file, in order of their number, instead of text files. guided turns on the 
+    guided path search for large boards.
+    seen is a SeenBoards or BloomFilter: boards already in it are dropped, in order of their number so
+    the same boards are kept whatever the number of workers, and the rest are added to it. Returns the 
+    GenerationStats of the whole batch added up and the number of duplicates dropped.
+    """
+    os.makedirs(out, exist_ok=True)
+    tasks = [
+        (index, m, n, max_distance, difficulty_bias, seed, out, render, max_restarts, max_backtracks, timeout, archive is not None, guided,
+         None if seen is None else seen.bits)
+        for index in range(start, start + count)
+    ]
+    writer = None if archive is None else ArchiveWriter(archive, m, n, max_distance=max_distance)
+    waiting = {} # Finished boards that can't be checked or go into the archive until the ones before them have.
+    next_index = start
+    stats = GenerationStats()
+    stats.boards = 0
+    duplicates = 0
+    writes = [] # Boards being written by the pool after passing the duplicate check
+
+    started = time.perf_counter()
+    if workers == 1:
+        finished = map(make_board, tasks)
+        pool = None
+    else:
+        pool = Pool(workers)
+        finished = pool.imap_unordered(make_board, tasks)
+
+    try:
+        for done, (index, error, b, b_seed, b_stats, key) in enumerate(finished, start=1):
+            stats += b_stats
+            if error is not None:
+                print(f'Board {index} skipped. {error}', flush=True)
+
+            if writer is not None or seen is not None:
+                waiting[index] = (b, b_seed, key)
+                while next_index in waiting:
+                    b, b_seed, key = waiting.pop(next_index)
+                    if b is not None and seen is not None and not seen.add(b, key):
+                        duplicates += 1
+                        b = None
+                    if b is not None and seen is not None:
+                        if pool is None:
+                            stats.add_time('render', write_board(b, next_index, out, render, writer is not None))
+                        else:
+                            writes.append(pool.apply_async(write_board, (b, next_index, out, render, writer is not None)))
+                    if b is not None and writer is not None:
+                        writer.add(b, number=next_index, seed=b_seed, difficulty=difficulty_bias)
+                    next_index += 1
+
+            if done % report_every == 0 or done == count:
+                elapsed = time.perf_counter() - started
+                dropped = f', {duplicates} duplicates dropped' if seen is not None else ''
+                print(f'{done}/{count} boards, {elapsed:.1f}s, {done / elapsed:.1f} boards/s{dropped}', flush=True)
+
+        for write in writes:
+            stats.add_time('render', write.get())
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if writer is not None:
+            writer.close()
+
+    return stats, duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a batch of jumping julia boards.")
+    parser.add_argument("m", type=int, help="Number of rows.")
+    parser.add_argument("n", type=int, help="Number of columns.")
+    parser.add_argument("--count", type=int, default=35, help="Number of boards to generate.")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed. The same seed always gives the same boards.")
+    parser.add_argument("--max-distance", type=int, default=None, help="Largest jump. Defaults to (m + n) // 2 - 2.")
+    parser.add_argument("--difficulty-bias", type=float, default=0.25, help="Chance of allowing jumps left and up.")
+    parser.add_argument("--out", default="generated", help="Folder the boards are written to.")
+    parser.add_argument("--start", type=int, default=1, help="Number of the first board.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes. Defaults to one per core.")
+    parser.add_argument("--render", action="store_true", help="Also write the board and solution images.")
+    parser.add_argument("--max-restarts", type=int, default=None, help="Skip boards that need more restarts than this.")
+    parser.add_argument("--max-backtracks", type=int, default=None, help="Skip boards whose path needs more backtracks than this.")
+    parser.add_argument("--timeout", type=float, default=None, help="Skip boards that take longer than this many seconds.")
+    parser.add_argument("--guided", action="store_true", help="Guided path search, for large boards (30x30 and up).")
+    parser.add_argument("--archive", default=None, help="Write the boards to this archive file instead of text files.")
+    parser.add_argument("--stats", action="store_true", help="Print the counters and phase times of the batch at the end.")
+    parser.add_argument("--dedup", default=None, help="Drop boards already in this file of seen boards, which is created if needed and saved at the end.")
+    parser.add_argument("--bloom", type=int, default=None, metavar="CAPACITY", help="Make a new --dedup file a Bloom filter with room for this many boards.")
+    args = parser.parse_args()
+
+    seen = None
+    if args.dedup is not None:
+        if args.bloom is not None and not os.path.exists(args.dedup):
+            seen = BloomFilter(args.bloom)
+        else:
+            seen = SeenBoards.open(args.dedup)
+
+    stats, duplicates = generate(
+        args.m, args.n, args.count, seed=args.seed, max_distance=args.max_distance, difficulty_bias=args.difficulty_bias,
+        out=args.out, render=args.render, workers=args.workers, start=args.start, 
+        max_restarts=args.max_restarts, max_backtracks=args.max_backtracks, timeout=args.timeout, archive=args.archive, guided=args.guided, seen=seen,
+    )
+    if seen is not None:
+        seen.save(args.dedup)
+        print(f'{duplicates} duplicates dropped, {len(seen)} boards seen in all.')
+    if args.stats:
+        print(stats)
+
+
+if __name__ == "__main__":
+    main()
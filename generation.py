@@ -0,0 +1,60 @@
+"""
+What the board generators have in common: logic.Board and the chess variant's variants/chess_logic.Chessboard
+raise the same error when they run out of budget and take their random numbers the same way.
+"""
+
+import numpy as np
+
+
+RANDOM_BATCH = 1024 # Most uniform draws a board takes from its generator at a time.
+
+
+class GenerationError(Exception):
+    """
+    Raised when a board can't be generated within its restart, backtrack or time budget.
+    """
+
+
+class BatchedDraws:
+    """
+    Mixin for a board with its own random generator. The board calls start_draws(seed) when it is
+    made, and its __getstate__ starts from the one here, which leaves out the draws not used yet.
+    """
+
+    def start_draws(self, seed):
+        """
+        Gives the board its own generator, so a seed always gives the same board. seed can also be a
+        SeedSequence or Generator.
+        """
+        self.rng = np.random.default_rng(seed)
+        self.draws = [] # Uniform floats drawn in batches of up to RANDOM_BATCH, used up from draws_used on.
+        self.draws_used = 0
+
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['draws'] = []
+        state['draws_used'] = 0
+        return state
+
+
+    def uniforms(self, count):
+        """
+        count uniform floats in [0, 1) from the board's generator, drawn in batches so the path
+        search doesn't make a generator call for every step.
+        """
+        start = self.draws_used
+        if start + count > len(self.draws):
+            # Batches start small and double, so a small board doesn't pay for draws it never uses.
+            self.draws = self.rng.random(max(min(2 * len(self.draws), RANDOM_BATCH), 64, count)).tolist()
+            start = 0
+        self.draws_used = start + count
+        return self.draws[start:start + count]
+
+
+def in_random_order(items, keys):
+    """
+    items in a random order, given at least one uniform draw per item in keys.
+    """
+    # Sorting by a random key per item is a uniform shuffle done by one C call.
+    return [items[k] for k in sorted(range(len(items)), key=keys.__getitem__)]
@@ -1,28 +1,218 @@
-import random
 # import matplotlib.pyplot as plt
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
-from matplotlib import colormaps
-from matplotlib.colors import Normalize
+# rendering pulls in PIL and matplotlib, so it is only imported by the methods that draw.
 import pickle
 import numpy as np
+import time
+from array import array
 
+from generation import BatchedDraws, GenerationError, in_random_order
 
-class Board:
-    def __init__(self, m, n, max_distance=None):
+
+GOAL = -1 # Value stored in the flat cell buffer for the 'X' square.
+
+
+class JumpTable:
+    """
+    Precomputed jump targets for an m x n board. Cells are numbered row-major as i * n + j.
+    For a cell c and distance d, backward[c * stride + d] holds the targets Left/Up of c and 
+    forward[c * stride + d] the targets Right/Down, so nothing is bounds checked or allocated 
+    while generating or solving. Use jump_table() to get the copy shared between boards.
+    """
+
+    def __init__(self, m, n, max_distance):
         self.m = m
         self.n = n
-        self.board = [[0 for _ in range(n)] for _ in range(m)]
+        self.size = m * n
+        self.goal = self.size - 1
+        self.max_distance = max_distance
+        self.stride = max(m, n, max_distance) + 1 # Every distance a cell value can take.
+
+        self.coords = tuple((i, j) for i in range(m) for j in range(n))
+        self.to_goal = tuple((m - 1 - i) + (n - 1 - j) for i, j in self.coords) # Manhattan distance to the goal.
+
+        self.backward = []
+        self.forward = []
+        for i, j in self.coords:
+            for distance in range(self.stride):
+                backward = []
+                forward = []
+                if distance:
+                    if 0 <= i - distance: # Left
+                        backward.append((i - distance) * n + j)
+                    if 0 <= j - distance: # Up
+                        backward.append(i * n + j - distance)
+                    if i + distance < m: # Right
+                        forward.append((i + distance) * n + j)
+                    if j + distance < n: # Down
+                        forward.append(i * n + j + distance)
+                self.backward.append(tuple(backward))
+                self.forward.append(tuple(forward))
+        self.both = [b + f for b, f in zip(self.backward, self.forward)]
+
+        # Candidate moves for the path generator, as (distance, target) pairs for distances up to max_distance.
+        # forward_moves[c] is always available, backward_moves[c] holds one group per distance that the
+        # difficulty bias either keeps or drops as a whole.
+        self.forward_moves = []
+        self.backward_moves = []
+        for cell in range(self.size):
+            forward = []
+            backward = []
+            for distance in range(1, max_distance + 1):
+                index = cell * self.stride + distance
+                forward.extend((distance, target) for target in self.forward[index])
+                if self.backward[index]:
+                    backward.append(tuple((distance, target) for target in self.backward[index]))
+            self.forward_moves.append(tuple(forward))
+            self.backward_moves.append(tuple(backward))
+
+
+class GenerationStats:
+    """
+    Counters and wall time per phase for everything done to one board: the path, the fill (including
+    repair, but not the paths made again when the fill starts over, which count as path time) and
+    rendering. A Board keeps adding to its stats; assign a new GenerationStats to start counting again.
+    Stats from many boards can be added up with +=.
+    """
+
+    COUNTERS = ['steps', 'backtracks', 'restarts', 'neighbor_calls', 'fill_restarts', 'repair_rounds', 'rerolls', 'dud_squares']
+
+    def __init__(self):
+        self.steps = 0 # Squares added to a path
+        self.backtracks = 0
+        self.restarts = 0 # Paths abandoned at the start
+        self.neighbor_calls = 0 # Candidate move lists drawn for the path
+        self.fill_restarts = 0 # Fills thrown away for a new path
+        self.repair_rounds = 0
+        self.rerolls = 0 # Squares given a new value by repair
+        self.dud_squares = 0 # Squares the fill found no safe distance for
+        self.times = {} # Phase -> seconds
+        self.boards = 1
+
+
+    def add_time(self, phase, seconds):
+        self.times[phase] = self.times.get(phase, 0.0) + seconds
+
+
+    def __iadd__(self, other):
+        for name in self.COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for phase, seconds in other.times.items():
+            self.add_time(phase, seconds)
+        self.boards += other.boards
+        return self
+
+
+    def as_dict(self):
+        out = {name: getattr(self, name) for name in self.COUNTERS}
+        out['times'] = dict(self.times)
+        out['boards'] = self.boards
+        return out
+
+
+    def __repr__(self):
+        fields = [f'boards={self.boards}'] + [f'{name}={getattr(self, name)}' for name in self.COUNTERS]
+        fields += [f'{phase}={seconds * 1000:.1f}ms' for phase, seconds in self.times.items()]
+        return f'GenerationStats({", ".join(fields)})'
+
+
+def print_trace(event, board, **details):
+    """
+    A trace hook that prints every event, for debugging. Use as board.trace = print_trace.
+    """
+    print(f'{event}: ' + ', '.join(f'{key}={value}' for key, value in details.items()))
+
+
+_jump_tables = {}
+
+def jump_table(m, n, max_distance):
+    """
+    Returns the JumpTable for the given dimensions, building it the first time it is asked for.
+    """
+    key = (m, n, max_distance)
+    if key not in _jump_tables:
+        _jump_tables[key] = JumpTable(m, n, max_distance)
+    return _jump_tables[key]
+
+
+class Board(BatchedDraws):
+    def __init__(self, m, n, max_distance=None, seed=None):
+        self.m = m
+        self.n = n
+        self.cells = array('b', bytes(m * n)) # Flat row-major grid. 0 is unfilled and GOAL is 'X'.
+        self.marked_duds = set() # Cells shown as f'{distance}X' when filled with show_duds.
+        self.dud_squares = [] # Squares the last fill found no safe distance for.
         self.path = []
+        self.difficulty_bias = 0.25 # Bias of the last path made, reused when the filler has to start over.
+        self.guided = False # Same for the guided mode of the last path.
         if max_distance is None:
             self.max_distance = (m + n) // 2 - 2
         else:
             self.max_distance = max_distance
+        self.jumps = jump_table(m, n, self.max_distance)
+        self.stats = GenerationStats()
+
+        # Every random choice comes from the board's own generator, so boards made side by side don't share any state.
+        self.start_draws(seed)
+
+        # Called as trace(event, board, **details) on every step, backtrack and restart of the path, 
+        # every restart of the fill and at the end of every phase. None for no tracing.
+        self.trace = None
+
+
+    def __getstate__(self):
+        # The jump table is shared and can be rebuilt, so it is not sent along when a board is pickled.
+        # Neither is the trace hook, which often can't be pickled, nor the draws not used yet.
+        state = super().__getstate__()
+        del state['jumps']
+        state['trace'] = None
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.jumps = jump_table(self.m, self.n, self.max_distance)
 
 
     def __str__(self):
         return "\n".join(" ".join(f'{cell: <5}' for cell in row) for row in self.board)
 
 
+    @property
+    def board(self):
+        """
+        The grid as a list of rows, with 'X' for the goal. This is built from self.cells on every access.
+        """
+        rows = []
+        for i in range(self.m):
+            row = []
+            for c in range(i * self.n, (i + 1) * self.n):
+                value = self.cells[c]
+                if value == GOAL:
+                    row.append('X')
+                elif c in self.marked_duds:
+                    row.append(f'{value}X')
+                else:
+                    row.append(value)
+            rows.append(row)
+        return rows
+
+
+    @board.setter
+    def board(self, rows):
+        self.cells = array('b', bytes(self.m * self.n))
+        self.marked_duds = set()
+        for i, row in enumerate(rows):
+            for j, value in enumerate(row):
+                c = i * self.n + j
+                if value == 'X':
+                    self.cells[c] = GOAL
+                elif isinstance(value, str):
+                    self.cells[c] = int(value.rstrip('X'))
+                    self.marked_duds.add(c)
+                else:
+                    self.cells[c] = value
+
+
     @classmethod
     def from_file(cls, board_filename, path_filename=None):
         """
@@ -52,23 +242,15 @@ class Board:
         """
         List of neighbors of a square at an given exact certain distance.
         """
-        neighbors = []
-
         assert 0 < distance <= max(self.m, self.n), "Distance must be between 1 and the maximum of m and n"
 
-        if random.random() < difficulty_bias:
-            if 0 <= square[0] - distance < self.m: # Left
-                neighbors.append((square[0] - distance, square[1]))
-            if 0 <= square[1] - distance < self.n: # Up
-                neighbors.append((square[0], square[1] - distance))
+        index = (square[0] * self.n + square[1]) * self.jumps.stride + distance
+        if self.uniforms(1)[0] < difficulty_bias:
+            targets = self.jumps.both[index]
+        else:
+            targets = self.jumps.forward[index]
 
-        if 0 <= square[0] + distance < self.m: # Right
-                neighbors.append((square[0] + distance, square[1]))
-        if 0 <= square[1] + distance < self.n: # Down
-                neighbors.append((square[0], square[1] + distance))
-        
-        
-        return neighbors
+        return [self.jumps.coords[target] for target in targets]
     
 
     def all_neighbors_and_distances(self, square, shuffled=True, difficulty_bias=1):
@@ -77,204 +259,574 @@ class Board:
         distances. In the format -- 
         [ (distance:int, neighbor:tup) ]
         """
+        coords = self.jumps.coords
+        return [
+            (distance, coords[target]) 
+            for distance, target in self._moves(square[0] * self.n + square[1], shuffled=shuffled, difficulty_bias=difficulty_bias)
+        ]
 
-        possible_distances = range(1, self.max_distance + 1)
-        possible_neighbors = []
 
-        for distance in possible_distances:
-            for neighbor in self.neighbors(square, distance, difficulty_bias=difficulty_bias):
-                possible_neighbors.append(
-                    (distance, neighbor)
-                )
+    def _moves(self, cell, shuffled=True, difficulty_bias=1):
+        """
+        Same as all_neighbors_and_distances but for a cell index, with neighbors as cell indices.
+        The (distance, neighbor) pairs come straight from the jump table.
+        """
+        possible_neighbors = list(self.jumps.forward_moves[cell])
+        groups = self.jumps.backward_moves[cell]
+        # One draw per group for the bias, then one per move for the shuffle. A group has at most two moves.
+        draws = self.uniforms(3 * len(groups) + len(possible_neighbors))
+        if difficulty_bias >= 1:
+            for group in groups:
+                possible_neighbors.extend(group)
+        elif difficulty_bias > 0:
+            for group, draw in zip(groups, draws):
+                if draw < difficulty_bias:
+                    possible_neighbors.extend(group)
 
         if shuffled:
-            random.shuffle(possible_neighbors)
+            possible_neighbors = in_random_order(possible_neighbors, draws[len(groups):])
 
         return possible_neighbors
 
 
-    def create_random_path(self, difficulty_bias=0.25):
+    def create_random_path(self, difficulty_bias=0.25, max_restarts=None, max_backtracks=None, timeout=None, guided=False):
+        """
+        Walks a random path from the start to the goal and writes its distances into the board.
+        The walk backtracks out of dead ends and starts over when it backs up to the start. 
+        Raises GenerationError when it needs more than max_restarts restarts or max_backtracks 
+        backtracks, or runs for longer than timeout seconds. None means no limit.
+
+        guided is meant for large boards, where a few walks get trapped in a corner and backtrack 
+        through it for minutes. It makes two changes. A step is only taken onto a square that still has 
+        a free move towards the goal, unless there is no such step. And a walk that backtracks more than 
+        once per square of the board starts over instead of digging on, so every walk is bounded.
+        """
         # These will be updated when there is a permanant change in the path.
-        # self.path[i] will have the number distances[i] in the grid. Meaning, distances[i] = self.path[i+1] - self.path[i]
-        self.path = []
-        distances = []
+        # path[i] will have the number distances[i] in the grid. Meaning, distances[i] = path[i+1] - path[i]
+        # The walk is done on cell indices, self.path is filled in with (i, j) squares at the end.
+        self.difficulty_bias = difficulty_bias
+        self.guided = guided
+        started = time.perf_counter()
+        deadline = None if timeout is None else started + timeout
+        jumps = self.jumps
+        goal = jumps.goal
+        trace = self.trace
+        restarts = 0
+        backtracks = 0
+        steps = 0
+        neighbor_calls = 0
+        forward_moves = jumps.forward_moves
+
+        while True:
+            path = []
+            distances = []
+
+            current_square = 0 # Working current square.
+
+            # Occupancy index, so that the checks below are O(1) however long the path gets.
+            # affected[c] counts how many path squares can reach c. The start counts as reached 
+            # so the path can never come back to it. bad[c] is set for the squares in bad_squares.
+            affected = array('H', [0]) * jumps.size
+            affected[0] = 1
+            bad = bytearray(jumps.size)
+
+            # Squares that have no neighbors that are not in the path, one list per square of the path so far.
+            # A square that is a dead end stays one while the path before it is kept, so its mark is only 
+            # dropped when the walk backs up past the square it was found from.
+            bad_squares = [[]]
+            affected_squares = [] # Squares that are reachable from the path, one tuple per step.
+            walk_backtracks = 0
+
+            while current_square != goal:
+                # Pick a random neighbor that is not in the path.
+                possible_neighbors = self._moves(current_square, difficulty_bias=difficulty_bias)
+                neighbor_calls += 1
+                fallback = None # With guided, the first step that passed everything but the look ahead.
+                for distance, neighbor in possible_neighbors:
+
+                    # Found next square if it is 
+                    # 1) Not a bad square. That is, it has not been tried before.
+                    # 2) Not an affected square. That is, It is not reachable from an earlier point in the path.
+                    # 3) Not be the same distance as the goal but not be the goal. That is, must not create a shortcut.
+                    
+                    # For 1) and 2)
+                    if not bad[neighbor] and not affected[neighbor]:
+                        
+                        # For 3)
+                        if neighbor != goal and distance == jumps.to_goal[current_square]:
+                            continue
+
+                        # Look one step ahead, so the walk doesn't step into a square it can only back out of.
+                        if guided and neighbor != goal and not any(
+                            not affected[target] and not bad[target] for _, target in forward_moves[neighbor]
+                        ):
+                            if fallback is None:
+                                fallback = (distance, neighbor)
+                            continue
+                        
+                        next_square = neighbor
+                        next_to_distance = distance
+                        break
+                
+                # If no new square is found, undo the last step in the path.
+                else:
+                    if fallback is not None:
+                        next_to_distance, next_square = fallback
+                    else:
+                        if not distances:
+                            break # Start over.
+
+                        backtracks += 1
+                        if trace is not None:
+                            trace('backtrack', self, square=jumps.coords[current_square], path_length=len(path))
+                        if max_backtracks is not None and backtracks > max_backtracks:
+                            self._path_stats(started, restarts, backtracks, steps, neighbor_calls)
+                            raise GenerationError(f'No path found for a {self.m}x{self.n} board within {max_backtracks} backtracks.')
+                        if deadline is not None and time.perf_counter() > deadline:
+                            self._path_stats(started, restarts, backtracks, steps, neighbor_calls)
+                            raise GenerationError(f'No path found for a {self.m}x{self.n} board within {timeout} seconds.')
+
+                        # With guided, a walk stuck this long is in a trap it would take ages to back out of.
+                        walk_backtracks += 1
+                        if guided and walk_backtracks > jumps.size:
+                            break # Start over.
+
+                        for square in bad_squares.pop():
+                            bad[square] = 0
+                        bad_squares[-1].append(current_square)
+                        bad[current_square] = 1
+                        current_square = path.pop()
+                        for square in affected_squares.pop():
+                            affected[square] -= 1
+                        distances.pop()
+                        continue
 
-        current_square = (0, 0) # Working current square.
+                steps += 1
+                if trace is not None:
+                    trace('step', self, square=jumps.coords[current_square], distance=next_to_distance, to=jumps.coords[next_square])
+                path.append(current_square)
+                reached = jumps.both[current_square * jumps.stride + next_to_distance]
+                for square in reached:
+                    affected[square] += 1
+                affected_squares.append(reached)
+                bad_squares.append([])
+                distances.append(next_to_distance)
+                current_square = next_square
 
-        bad_squares = [] # Squares that have no neighbors that are not in the path.
-        affected_squares = [] # Squares that are reachable from the path.
+            else:
+                break # Reached the goal.
 
-        while current_square != (self.m - 1, self.n - 1):
-            # Debugging print line
-            # print(f'Path: {self.path}\nCurrent square: {current_square}\nBad squares: {bad_squares}\nAffected squares: {affected_squares}\nDistances: {distances}\n\n')
-            
-            # Pick a random neighbor that is not in the path.
-            possible_neighbors = self.all_neighbors_and_distances(current_square, difficulty_bias=difficulty_bias)
-            for distance, neighbor in possible_neighbors:
+            restarts += 1
+            if trace is not None:
+                trace('restart', self, restarts=restarts)
+            if max_restarts is not None and restarts > max_restarts:
+                self._path_stats(started, restarts, backtracks, steps, neighbor_calls)
+                raise GenerationError(f'No path found for a {self.m}x{self.n} board within {max_restarts} restarts.')
+            if deadline is not None and time.perf_counter() > deadline:
+                self._path_stats(started, restarts, backtracks, steps, neighbor_calls)
+                raise GenerationError(f'No path found for a {self.m}x{self.n} board within {timeout} seconds.')
 
-                # Found next square if it is 
-                # 1) Not a bad square. That is, it has not been tried before.
-                # 2) Not an affected square. That is, It is not reachable from an earlier point in the path.
-                # 3) Not be the same distance as the goal but not be the goal. That is, must not create a shortcut.
-                
-                # For 1) and 2)
-                if neighbor not in bad_squares and all(neighbor not in as_ for as_ in affected_squares):
-                    
-                    # For 3)
-                    if neighbor != (self.m - 1, self.n - 1) and distance == (abs(current_square[0] - (self.m - 1)) + abs(current_square[1] - (self.n - 1))):
+        self._path_stats(started, restarts, backtracks, steps, neighbor_calls)
+
+        # Mark all the squares in the path
+        path.append(goal)
+        for square, distance in zip(path, distances):
+            self.cells[square] = distance
+        self.path = [jumps.coords[square] for square in path]
+
+
+    def _path_stats(self, started, restarts, backtracks, steps, neighbor_calls):
+        # Counters are kept in locals while the path is made and handed over once at the end.
+        self.restarts, self.backtracks = restarts, backtracks
+        stats = self.stats
+        stats.restarts += restarts
+        stats.backtracks += backtracks
+        stats.steps += steps
+        stats.neighbor_calls += neighbor_calls
+        self._end_phase('path', started)
+
+
+    def _end_phase(self, phase, started):
+        seconds = time.perf_counter() - started
+        self.stats.add_time(phase, seconds)
+        if self.trace is not None:
+            self.trace('phase', self, phase=phase, seconds=seconds)
+        return seconds
+
+        
+    def fill_remaining_squares(self, show_duds=False, restart_for_zeros=False, max_restarts=None, timeout=None, max_backtracks=None):
+        """
+        Fills every square off the path with a distance that can't jump onto the path. Squares where
+        no such distance exists are handed to repair(). Only if that fails and restart_for_zeros is 
+        set is the board thrown away and made again with a new path, at most max_restarts times and 
+        for at most timeout seconds in total before GenerationError is raised. Every new path gets 
+        max_restarts and max_backtracks as its own budget too. None means no limit.
+        """
+        started = time.perf_counter()
+        deadline = None if timeout is None else started + timeout
+        jumps = self.jumps
+        self.fill_restarts = 0
+        path_time = self.stats.times.get('path', 0.0)
+
+        while True:
+            self.cells[jumps.goal] = GOAL
+
+            # Every square gets a random distance out of the ones it is allowed, all at once.
+            # The squares in dud_squares have none and are left for repair().
+            allowed, self.dud_squares = self.allowed_distances()
+            keys = self.rng.random(allowed.shape)
+            keys[~allowed] = -1
+            choice = keys.argmax(axis=2) + 1
+            fillable = allowed.any(axis=2)
+            cells = np.frombuffer(self.cells, dtype=np.int8).reshape(self.m, self.n)
+            cells[fillable] = choice[fillable]
+            self.stats.dud_squares += len(self.dud_squares)
+
+            if self.repair() or not restart_for_zeros:
+                break
+
+            self.fill_restarts += 1
+            self.stats.fill_restarts += 1
+            if self.trace is not None:
+                self.trace('fill_restart', self, fill_restarts=self.fill_restarts)
+            if max_restarts is not None and self.fill_restarts > max_restarts:
+                self._end_fill(started, path_time)
+                raise GenerationError(f'Could not fill a {self.m}x{self.n} board within {max_restarts} restarts.')
+            if deadline is not None and time.perf_counter() > deadline:
+                self._end_fill(started, path_time)
+                raise GenerationError(f'Could not fill a {self.m}x{self.n} board within {timeout} seconds.')
+
+            self.cells = array('b', bytes(jumps.size))
+            self.marked_duds = set()
+            self.create_random_path(
+                difficulty_bias=self.difficulty_bias, guided=self.guided, max_restarts=max_restarts, max_backtracks=max_backtracks,
+                timeout=None if deadline is None else max(deadline - time.perf_counter(), 0),
+            )
+
+        if show_duds:
+            on_path = {i * self.n + j for i, j in self.path}
+            self.marked_duds = {square for square in range(jumps.size) if square not in on_path and self.cells[square] > 0}
+
+        self._end_fill(started, path_time)
+
+
+    def _end_fill(self, started, path_time):
+        # Time spent making new paths after a failed fill is path time, not fill time.
+        self._end_phase('fill', started + self.stats.times.get('path', 0.0) - path_time)
+
+
+    def allowed_distances(self):
+        """
+        Works out in one pass which distances every unfilled square can take without any of its
+        jumps landing on the path. Returns a boolean array of shape (m, n, max_distance) where 
+        [i, j, d - 1] is True if square (i, j) can take distance d, and the list of unfilled 
+        squares that can't take any distance.
+        """
+        on_path = np.zeros((self.m, self.n), dtype=bool)
+        if self.path:
+            rows, columns = zip(*self.path)
+            on_path[list(rows), list(columns)] = True
+
+        hits = np.zeros((self.m, self.n, self.max_distance), dtype=bool)
+        for distance in range(1, self.max_distance + 1):
+            hit = hits[:, :, distance - 1]
+            hit[distance:, :] |= on_path[:-distance, :] # Left
+            hit[:, distance:] |= on_path[:, :-distance] # Up
+            hit[:-distance, :] |= on_path[distance:, :] # Right
+            hit[:, :-distance] |= on_path[:, distance:] # Down
+
+        unfilled = np.frombuffer(self.cells, dtype=np.int8).reshape(self.m, self.n) == 0
+        allowed = ~hits & unfilled[:, :, None]
+        dud_squares = [tuple(square) for square in np.argwhere(unfilled & ~allowed.any(axis=2)).tolist()]
+
+        return allowed, dud_squares
+
+
+    def repair(self, max_rounds=10):
+        """
+        Re-rolls only the squares off the path that stop self.path from being the one solution: 
+        squares that are still unfilled, and squares on a second route to 'X' of any length. A square 
+        reached from path[k] may only take a value that lands on path[k] or earlier, or on squares that 
+        can't get back to the path past path[k]. The reach used for that check is brought up to date 
+        after every change. Returns True if the path ends up as the only solution, and False when 
+        a round finds no value that keeps it so.
+        """
+        jumps = self.jumps
+        cells = self.cells
+        stride = jumps.stride
+
+        for _ in range(max_rounds):
+            self.stats.repair_rounds += 1
+            first, last = self.path_reach()
+
+            culprits = [square for square in range(jumps.size) if cells[square] == 0 or first[square] < last[square]]
+            if not culprits:
+                break
+
+            # The order every culprit tries the distances in, all drawn at once.
+            changed = False
+            orders = (self.rng.random((len(culprits), self.max_distance)).argsort(axis=1) + 1).tolist()
+            for square, possible_distances in zip(culprits, orders):
+                if cells[square] and first[square] >= last[square]:
+                    continue # Already taken care of by an earlier change.
+
+                for distance in possible_distances:
+                    neighbors = jumps.both[square * stride + distance]
+                    # Jumping from here must not get back to the path past the square this one is reached from.
+                    if any(last[neighbor] > first[square] for neighbor in neighbors):
                         continue
-                    
-                    next_square = neighbor
-                    next_to_distance = distance
-                    bad_squares = []
+
+                    cells[square] = distance
+                    self.stats.rerolls += 1
+                    changed = True
+                    if first[square] < len(self.path) or any(0 <= last[neighbor] for neighbor in neighbors):
+                        first, last = self.path_reach()
                     break
-            
-            # If no new square is found, undo the last step in the path.
-            else:
-                if not distances:
-                    return self.create_random_path(difficulty_bias=difficulty_bias) 
 
-                bad_squares.append(current_square)
-                current_square = self.path.pop()
-                affected_squares.pop()
-                distances.pop()
-                continue
+            if not changed:
+                return False
 
-            self.path.append(current_square)
-            affected_squares.append(self.neighbors(current_square, next_to_distance))
-            distances.append(next_to_distance)
-            current_square = next_square
+        return self.path_is_only_solution()
 
-        # Mark all the squares in the path
-        self.path.append((self.m - 1, self.n - 1))
-        for square, distance in zip(self.path, distances):
-            self.board[square[0]][square[1]] = distance
 
-        
-    def fill_remaining_squares(self, show_duds=False, restart_for_zeros=False):
-        self.board[self.m - 1][self.n - 1] = 'X'
+    def path_reach(self):
+        """
+        For every square, the index in self.path of the first path square it can be reached from and 
+        of the last one it can get to, going only through squares off the path. Returns (first, last) 
+        as flat arrays over cell indices, with len(self.path) in first for squares the path never reaches 
+        and -1 in last for squares that can't get back to it. Path squares hold their own index in both. 
+        A square with first < last is on a second route to 'X'. Linear in the number of cells.
+        """
+        jumps = self.jumps
+        cells = self.cells
+        path = [i * self.n + j for i, j in self.path]
+
+        first = array('i', [len(path)]) * jumps.size
+        last = array('i', [-1]) * jumps.size
+        for k, square in enumerate(path):
+            first[square] = last[square] = k
+
+        jumped_from = [[] for _ in range(jumps.size)]
+        for cell in range(jumps.size):
+            distance = cells[cell]
+            if 0 < distance < jumps.stride:
+                for neighbor in jumps.both[cell * jumps.stride + distance]:
+                    jumped_from[neighbor].append(cell)
+
+        # Searching from the path squares in order means every square is labelled by the first one that gets there.
+        for k, square in enumerate(path):
+            frontier = [square]
+            while frontier:
+                cell = frontier.pop()
+                distance = cells[cell]
+                if not 0 < distance < jumps.stride:
+                    continue
+                for neighbor in jumps.both[cell * jumps.stride + distance]:
+                    if first[neighbor] == len(path):
+                        first[neighbor] = k
+                        frontier.append(neighbor)
+
+        # And backwards from the last path square to the first for last.
+        for k in range(len(path) - 1, -1, -1):
+            frontier = [path[k]]
+            while frontier:
+                for neighbor in jumped_from[frontier.pop()]:
+                    if last[neighbor] < 0:
+                        last[neighbor] = k
+                        frontier.append(neighbor)
+
+        return first, last
+
+
+    def path_is_only_solution(self):
+        """
+        True if every square is filled and self.path is the only route to 'X' that never visits a 
+        square twice, whatever its length. This is the check a board needs before it is published.
+        """
+        jumps = self.jumps
+        cells = self.cells
+        if not self.path or 0 in cells:
+            return False
 
-        dud_squares = []
-        for i in range(self.m):
-            for j in range(self.n):
-                if self.board[i][j] == 0:
-                    dud_squares.append((i, j))
-
-        possible_distances = list(range(1, self.max_distance + 1))
-        while dud_squares:
-            random.shuffle(possible_distances)
-            i, j = dud_squares.pop()
-            
-            for distance in possible_distances:
-                if all(neighbor not in self.path for neighbor in self.neighbors((i, j), distance)):
-                    self.board[i][j] = f'{distance}X' if show_duds else distance
-                    break  
-            else:
-                if restart_for_zeros:
-                    self.board = [[0 for _ in range(self.n)] for _ in range(self.m)]
-                    self.create_random_path()
-                    self.fill_remaining_squares(show_duds=show_duds, restart_for_zeros=restart_for_zeros)
-                    return
+        path = [i * self.n + j for i, j in self.path]
+        if path[0] != 0 or path[-1] != jumps.goal:
+            return False
+        for square, next_square in zip(path, path[1:]):
+            if next_square not in jumps.both[square * jumps.stride + cells[square]]:
+                return False
 
+        first, last = self.path_reach()
+        if any(first[square] < last[square] for square in range(jumps.size)):
+            return False
 
-    def all_possible_paths(self): #TODO
+        # A path square that jumps straight past the next one.
+        for k, square in enumerate(path[:-1]):
+            if any(last[neighbor] > k + 1 for neighbor in jumps.both[square * jumps.stride + cells[square]]):
+                return False
+
+        return True
+
+
+    def search_from_start(self, cap=2, stop_at_goal=True):
+        """
+        Breadth first search from the start over the jumps the cell values allow, in all four directions.
+        Returns (level, count, parent) as flat arrays over cell indices. level is the number of jumps 
+        needed to reach a cell (-1 if unreachable), count the number of shortest routes to it (capped at cap)
+        and parent the cell it was first reached from. The search stops once the goal's level is finished, 
+        or as soon as the goal has cap shortest routes, unless stop_at_goal is False. Linear in the number of cells.
+        """
+        jumps = self.jumps
+        cells = self.cells
+        goal = jumps.goal
+
+        level = array('i', [-1]) * jumps.size
+        count = array('i', [0]) * jumps.size
+        parent = array('i', [-1]) * jumps.size
+        level[0] = 0
+        count[0] = 1
+
+        frontier = [0]
+        depth = 0
+        while frontier and (level[goal] < 0 or not stop_at_goal):
+            depth += 1
+            next_frontier = []
+            for cell in frontier:
+                distance = cells[cell]
+                if not 0 < distance < jumps.stride:
+                    continue
+
+                for neighbor in jumps.both[cell * jumps.stride + distance]:
+                    if level[neighbor] < 0:
+                        level[neighbor] = depth
+                        count[neighbor] = count[cell]
+                        parent[neighbor] = cell
+                        next_frontier.append(neighbor)
+                    elif level[neighbor] == depth:
+                        count[neighbor] = min(cap, count[neighbor] + count[cell])
+                    else:
+                        continue
+
+                    if neighbor == goal and count[goal] >= cap and stop_at_goal:
+                        return level, count, parent
+
+            frontier = next_frontier
+
+        return level, count, parent
+
+
+    def search_to_goal(self):
+        """
+        Breadth first search backwards from the goal. Returns a flat array with the number of jumps 
+        each cell needs to reach 'X', or -1 if it can't. Linear in the number of cells.
+        """
+        jumps = self.jumps
+        cells = self.cells
+
+        jumped_from = [[] for _ in range(jumps.size)]
+        for cell in range(jumps.size):
+            distance = cells[cell]
+            if 0 < distance < jumps.stride:
+                for neighbor in jumps.both[cell * jumps.stride + distance]:
+                    jumped_from[neighbor].append(cell)
+
+        level = array('i', [-1]) * jumps.size
+        level[jumps.goal] = 0
+        frontier = [jumps.goal]
+        depth = 0
+        while frontier:
+            depth += 1
+            next_frontier = []
+            for cell in frontier:
+                for neighbor in jumped_from[cell]:
+                    if level[neighbor] < 0:
+                        level[neighbor] = depth
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+
+        return level
+
+
+    def solve(self, cap=2):
+        """
+        Returns (path, count) where path is a shortest solution as a list of squares, or None if 'X' 
+        is unreachable, and count is the number of distinct shortest solutions capped at cap. 
+        The solution takes len(path) - 1 jumps. Longer routes are not counted, so a count of 1 
+        doesn't make the solution unique; use path_is_only_solution() for that.
+        """
+        level, count, parent = self.search_from_start(cap=cap)
+
+        square = self.jumps.goal
+        if level[square] < 0:
+            return None, 0
+
+        path = []
+        while square >= 0:
+            path.append(self.jumps.coords[square])
+            square = parent[square]
+
+        return path[::-1], count[self.jumps.goal]
+
+
+    def count_shortest_solutions(self, cap=2):
         """
-        Returns all possible paths from the start to the end.
+        Number of shortest solutions, counting no further than cap. Longer solutions are not counted.
         """
-        queue = [((0, 0), None)] # In the format (square, parent)
-        seen = []
+        level, count, parent = self.search_from_start(cap=cap)
+        return count[self.jumps.goal]
+
 
-        while queue:
-            current_square, parent = queue.pop(0)
-            if current_square == (self.m - 1, self.n - 1):
-                path = []
-                while current_square:
-                    path.append(current_square)
-                    current_square = parent
-                yield path[::-1]
+    def is_solvable(self):
+        return self.count_shortest_solutions(cap=1) > 0
 
-            for neighbor in self.neighbors(current_square, self.board[current_square[0]][current_square[1]]):
-                if neighbor not in seen:
-                    queue.append((neighbor, current_square))
-                    seen.append(neighbor)
+
+    def has_unique_shortest_solution(self):
+        """
+        True if only one solution takes the fewest jumps. There can still be longer ones.
+        """
+        return self.count_shortest_solutions(cap=2) == 1
 
 
     def number_to_color(self, number):
-        if type(number) == str:
-            number = 0
-        
-        norm = Normalize(vmin=0, vmax=self.max_distance + 1)
-        colormap = colormaps['Blues']  # Try different colormaps here
-        rgba = colormap(norm(number))
-        return '#{:02x}{:02x}{:02x}'.format(int(rgba[0]*255), int(rgba[1]*255), int(rgba[2]*255))
+        import rendering
+
+        return rendering.default_renderer().number_to_color(number, self.max_distance)
 
 
     @staticmethod
     def add_drop_shadow(image, offset=(5, 5), background_color=0xffffff, shadow_color=0x000000, border=10, iterations=5):
-        total_width = image.width + abs(offset[0]) + 2 * border
-        total_height = image.height + abs(offset[1]) + 2 * border
-        shadow = Image.new(image.mode, (total_width, total_height), background_color)
-        
-        shadow_left = border + max(offset[0], 0)
-        shadow_top = border + max(offset[1], 0)
-        
-        shadow.paste(shadow_color, [shadow_left, shadow_top, shadow_left + image.width, shadow_top + image.height])
-        
-        for _ in range(iterations):
-            shadow = shadow.filter(ImageFilter.BLUR)
-        
-        img = Image.new(image.mode, (total_width, total_height), background_color)
-        img.paste(shadow, (0, 0))
-        img.paste(image, (border, border))
-        
-        return img
+        import rendering
 
+        return rendering.add_drop_shadow(
+            image, offset=offset, background_color=background_color, shadow_color=shadow_color, border=border, iterations=iterations
+        )
 
-    def create_board_image(self, filename="jumping_julia_board.png", show_path=False):
-        cell_size = 100  # Size of each cell in pixels
-        img_size = (self.n * cell_size, self.m * cell_size)
-        
-        img = Image.new('RGB', img_size, color='white')
-        draw = ImageDraw.Draw(img)
-        
-        # font = ImageFont.load_default()  # Use default font
-        font = ImageFont.truetype("/Library/Fonts/Arial Unicode.ttf", size=30)
-        small_font = ImageFont.truetype("/Library/Fonts/Arial Unicode.ttf", size=20)
-        
-        for i in range(self.m):
-            for j in range(self.n):
-                
-                number = self.board[i][j]
-                color = self.number_to_color(number)
-                
-                top_left_corner = (j * cell_size, i * cell_size)
-                bottom_right_corner = ((j + 1) * cell_size, (i + 1) * cell_size)
-                x0, y0 = top_left_corner
-                x1, y1 = bottom_right_corner
-    
-                # Determine if the cell is part of the path
-                if show_path and (i, j) in self.path:
-                    outline_color = "yellow"
-                    outline_width = 5
-                else:
-                    outline_color = "black"
-                    outline_width = 2
 
-                # Draw the rounded rectangle with an outline for path cells
-                draw.rounded_rectangle([x0, y0, x1, y1], radius=20, fill=color, outline=outline_color, width=outline_width)
-                
-                text_position = (j * cell_size + cell_size // 2, i * cell_size + cell_size // 2)
-                draw.text(text_position, str(number), fill="black", font=font, anchor="mm")
-
-        if show_path:
-            for index, (x, y) in enumerate(self.path):                
-                # Draw the sequential number in the top-right corner of each square
-                number_position = (y * cell_size + cell_size - 25, x * cell_size + 15)
-                draw.text(number_position, str(index + 1), fill="yellow", font=small_font, anchor="mm")
-    
-        img = Board.add_drop_shadow(img, offset=(10, 10), shadow_color="black", border=20)
+    def create_board_image(self, filename="jumping_julia_board.png", show_path=False, renderer=None, compress_level=6, optimize=False):
+        """
+        Saves an image of the board. Drawn by the shared rendering.BoardRenderer unless another renderer is given.
+        """
+        started = time.perf_counter()
+        if renderer is None:
+            import rendering
+
+            renderer = rendering.default_renderer()
+        img = renderer.render(self, show_path=show_path)
         # img.show()  # For preview
-        img.save(filename)  # Save the image as a file
+        img.save(filename, compress_level=compress_level, optimize=optimize)  # Save the image as a file
+        self._end_phase('render', started)
+
+
+    def create_board_images(self, board_filename="jumping_julia_board.png", solution_filename="jumping_julia_solution.png", renderer=None, compress_level=6, optimize=False):
+        """
+        Saves the board image and the solution image together, drawing the board only once.
+        """
+        started = time.perf_counter()
+        if renderer is None:
+            import rendering
+
+            renderer = rendering.default_renderer()
+        renderer.save(self, board_filename, solution_filename, compress_level=compress_level, optimize=optimize)
+        self._end_phase('render', started)
 
 
     def create_path_text_file(self, filename="jumping_julia_path.txt"):
@@ -289,6 +841,18 @@ class Board:
                 f.write(" ".join(str(x) for x in row) + '\n')
 
 
+    @classmethod
+    def from_archive(cls, filename, index):
+        """
+        Constructor to read the board at the given index of an archive made by board_archive.
+        For reading many boards, keep a board_archive.BoardArchive open instead.
+        """
+        from board_archive import BoardArchive
+
+        with BoardArchive(filename) as archive:
+            return archive[index]
+
+
     @classmethod
     def from_pickle(cls, filename):
         """
@@ -312,18 +876,25 @@ if __name__ == "__main__":
 
     # DEBUGGING BOARDS
 
+    from board_dedup import SeenBoards
+    seen = SeenBoards.open("debugging_boards/seen.npz") # Small 6x6 boards come up again often enough to skip
+
     for seed in range(198, 500):
     # for seed in concerns:
-        # random.seed(42 + seed)
-        b = Board(6, 6, max_distance=5)
+        b = Board(6, 6, max_distance=5, seed=seed)
         b.create_random_path(difficulty_bias=0.25)
         b.fill_remaining_squares(show_duds=False, restart_for_zeros=True)
+        if not seen.add(b):
+            print(f'Board {seed} is a duplicate.')
+            continue
         b.create_board_image(filename=f"debugging_boards/{seed}.png", show_path=True)
         print(f'Board {seed} created.')
         
         pickle.dump(b.board, open(f"debugging_boards/pickle_{seed}.pkl", "wb"))
         print(f'Board {seed} pickled.')
 
+    seen.save("debugging_boards/seen.npz")
+
 
 
     # RECOLORING BOARDS
@@ -334,10 +905,20 @@ if __name__ == "__main__":
     #         board_filename=f"boards/{difficulty}/jumping_julia_board_{board_index}.txt", 
     #         path_filename=f"boards/{difficulty}/jumping_julia_path_{board_index}.txt"
     #     )
-    #     b.create_board_image(filename=f"boards/{difficulty}/jumping_julia_board_{board_index}.png")
-    #     b.create_board_image(filename=f"boards/{difficulty}/jumping_julia_solution_{board_index}.png", show_path=True)
+    #     b.create_board_images(
+    #         board_filename=f"boards/{difficulty}/jumping_julia_board_{board_index}.png",
+    #         solution_filename=f"boards/{difficulty}/jumping_julia_solution_{board_index}.png",
+    #     )
     #     print(f'Board {board_index} created. ({difficulty})')
 
+    # Or all of them at once, over a process pool
+    # jobs = []
+    # for board_index in range(1, 36):
+    #     b = Board.from_file(...)
+    #     jobs.append((b, f"boards/{difficulty}/jumping_julia_board_{board_index}.png", f"boards/{difficulty}/jumping_julia_solution_{board_index}.png"))
+    # for board_filename, solution_filename in rendering.render_many(jobs, optimize=True):
+    #     print(f'{board_filename} created.')
+
 
     
     # CREATING BOARDS
@@ -0,0 +1,397 @@
+"""
+A local HTTP service that hands out fresh boards straight from memory.
+
+Boards of every size given with --sizes are generated ahead of time by a process pool and kept in a pool
+per (size, difficulty), which is topped up in the background as boards are taken, so a request for one of
+them never waits for generation. Other sizes are refused, so clients can't make the server build and keep
+the jump tables of sizes nobody configured. A pool whose boards keep failing to generate backs off and, after
+REFILL_GIVE_UP failed batches in a row, stops refilling and falls back to generating on demand. Images are drawn on first request, also in the process pool, and cached.
+
+    python puzzle_server.py --sizes 8x8,10x10 --depth 32 --port 8000
+
+    GET /board?size=10x10&difficulty=hard   a new board as JSON
+    GET /boards/<id>                         the same board again
+    GET /boards/<id>/solution                its path
+    GET /boards/<id>.png                     its image, /boards/<id>/solution.png with the path marked
+    GET /metrics                             pool depths, refill counts and latency percentiles per route
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import random
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from generate_boards import board_seed
+from logic import Board, GenerationError
+
+
+DIFFICULTIES = {'easy': 0.0, 'medium': 0.25, 'hard': 0.5} # difficulty_bias of each difficulty
+GUIDED_CELLS = 900 # Boards with at least this many cells use the guided path search.
+BOARD_TIMEOUT = 10 # Seconds one board may take, path and fill together.
+LATENCY_WINDOW = 10000 # Latencies kept per route for the percentiles.
+REFILL_BACKOFF = 1.0 # Seconds a refill waits after a batch with no board in it, doubled for every such batch in a row.
+REFILL_GIVE_UP = 6 # Batches in a row with no board in them before a pool stops refilling.
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 503: 'Service Unavailable'}
+
+
+def make_board(m, n, difficulty_bias, seed):
+    """
+    Generates one board from its seed. Runs in a worker process. Returns None if it ran out of budget.
+    """
+    b = Board(m, n, seed=seed)
+    deadline = time.perf_counter() + BOARD_TIMEOUT
+    try:
+        b.create_random_path(difficulty_bias=difficulty_bias, guided=m * n >= GUIDED_CELLS, timeout=BOARD_TIMEOUT)
+        b.fill_remaining_squares(restart_for_zeros=True, timeout=max(deadline - time.perf_counter(), 0))
+    except GenerationError:
+        return None
+    return b
+
+
+def render_png(board, show_path):
+    """
+    Draws a board as PNG bytes. Runs in a worker process, each with its own renderer.
+    """
+    import rendering
+
+    buffer = io.BytesIO()
+    rendering.default_renderer().render(board, show_path=show_path).save(buffer, format='PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+def parse_size(text):
+    m, n = (int(side) for side in text.lower().split('x'))
+    if not 4 <= m <= 60 or not 4 <= n <= 60:
+        raise ValueError(f"Boards go from 4x4 to 60x60, not {text}")
+    return m, n
+
+
+class Latencies:
+    """
+    The latest LATENCY_WINDOW latencies of one route, in milliseconds.
+    """
+
+    def __init__(self):
+        self.values = deque(maxlen=LATENCY_WINDOW)
+        self.count = 0
+
+
+    def add(self, milliseconds):
+        self.values.append(milliseconds)
+        self.count += 1
+
+
+    def summary(self):
+        if not self.values:
+            return {'count': self.count}
+        p50, p90, p99 = np.percentile(np.fromiter(self.values, dtype=float), [50, 90, 99])
+        return {'count': self.count, 'p50_ms': p50, 'p90_ms': p90, 'p99_ms': p99, 'max_ms': max(self.values)}
+
+
+class PuzzleServer:
+    """
+    The pools, the caches and the request handling. There is a pool for every size in sizes and every
+    difficulty, kept at depth boards by one refill task, which has at most refill_batch boards being 
+    generated at a time.
+    """
+
+    def __init__(self, sizes, depth=32, workers=None, seed=None, served=10000, images=1000, refill_batch=4):
+        self.depth = depth
+        self.refill_batch = refill_batch
+        self.executor = ProcessPoolExecutor(workers)
+        self.base_seed = random.randrange(2 ** 32) if seed is None else seed
+        self.next_index = 0
+
+        self.pools = {} # (m, n, difficulty) -> deque of boards ready to go
+        self.wanted = {} # (m, n, difficulty) -> Event set when a board is taken from the pool
+        self.refills = {} # (m, n, difficulty) -> refill task
+        self.given_up = set() # Pools that stopped refilling after REFILL_GIVE_UP failed batches
+        self.generated = 0
+        self.failed = 0
+        self.on_demand = 0 # Boards generated for a request because their pool was empty
+
+        self.served = OrderedDict() # id -> (board, difficulty), the latest boards handed out
+        self.handed_out = 0
+        self.max_served = served
+        self.images = OrderedDict() # (id, show_path) -> PNG bytes
+        self.max_images = images
+        self.image_hits = 0
+        self.image_misses = 0
+
+        self.latencies = {}
+        self.started = time.time()
+        self.initial_sizes = sizes
+
+
+    async def start(self, host, port):
+        for m, n in self.initial_sizes:
+            for difficulty in DIFFICULTIES:
+                self.pool(m, n, difficulty)
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server
+
+
+    def pool(self, m, n, difficulty):
+        """
+        The pool for a size and difficulty, started with its refill task the first time it is asked for.
+        Only called for the sizes the server was started with.
+        """
+        key = (m, n, difficulty)
+        if key not in self.pools:
+            self.pools[key] = deque()
+            self.wanted[key] = asyncio.Event()
+            self.refills[key] = asyncio.create_task(self.refill(key))
+        return self.pools[key]
+
+
+    async def generate(self, m, n, difficulty):
+        seed = board_seed(self.base_seed, self.next_index)
+        self.next_index += 1
+        b = await asyncio.get_running_loop().run_in_executor(self.executor, make_board, m, n, DIFFICULTIES[difficulty], seed)
+        if b is None:
+            self.failed += 1
+        else:
+            self.generated += 1
+        return b
+
+
+    async def refill(self, key):
+        m, n, difficulty = key
+        pool = self.pools[key]
+        wanted = self.wanted[key]
+        failed_batches = 0
+        while True:
+            missing = self.depth - len(pool)
+            if missing <= 0:
+                wanted.clear()
+                await wanted.wait()
+                continue
+
+            boards = await asyncio.gather(*[self.generate(m, n, difficulty) for _ in range(min(missing, self.refill_batch))])
+            boards = [b for b in boards if b is not None]
+            pool.extend(boards)
+            if boards:
+                failed_batches = 0
+                continue
+
+            # Nothing came out of the batch, so don't keep the workers busy with boards that time out.
+            failed_batches += 1
+            if failed_batches >= REFILL_GIVE_UP:
+                self.given_up.add(key)
+                return
+            await asyncio.sleep(REFILL_BACKOFF * 2 ** (failed_batches - 1))
+
+
+    async def take(self, m, n, difficulty):
+        """
+        A board from the pool, or a new one if the pool has run dry.
+        """
+        key = (m, n, difficulty)
+        pool = self.pools[key]
+        self.wanted[key].set()
+        if pool:
+            return pool.popleft()
+
+        self.on_demand += 1
+        for _ in range(3):
+            b = await self.generate(m, n, difficulty)
+            if b is not None:
+                return b
+        return None
+
+
+    def remember(self, b, difficulty):
+        board_id = f'{self.base_seed:x}-{self.handed_out}'
+        self.handed_out += 1
+        self.served[board_id] = (b, difficulty)
+        if len(self.served) > self.max_served:
+            self.served.popitem(last=False)
+        return board_id
+
+
+    def board_json(self, board_id):
+        b, difficulty = self.served[board_id]
+        return {
+            'id': board_id,
+            'm': b.m,
+            'n': b.n,
+            'difficulty': difficulty,
+            'board': b.board,
+            'image': f'/boards/{board_id}.png',
+            'solution_image': f'/boards/{board_id}/solution.png',
+            'solution': f'/boards/{board_id}/solution',
+        }
+
+
+    async def image(self, board_id, show_path):
+        key = (board_id, show_path)
+        if key in self.images:
+            self.image_hits += 1
+            self.images.move_to_end(key)
+            return self.images[key]
+
+        self.image_misses += 1
+        b, difficulty = self.served[board_id]
+        png = await asyncio.get_running_loop().run_in_executor(self.executor, render_png, b, show_path)
+        self.images[key] = png
+        if len(self.images) > self.max_images:
+            self.images.popitem(last=False)
+        return png
+
+
+    def metrics(self):
+        return {
+            'uptime_s': time.time() - self.started,
+            'pools': {f'{m}x{n}/{difficulty}': len(pool) for (m, n, difficulty), pool in self.pools.items()},
+            'depth': self.depth,
+            'generated': self.generated,
+            'failed': self.failed,
+            'on_demand': self.on_demand,
+            'given_up': [f'{m}x{n}/{difficulty}' for m, n, difficulty in self.given_up],
+            'served': len(self.served),
+            'image_cache': {'size': len(self.images), 'hits': self.image_hits, 'misses': self.image_misses},
+            'latency': {route: latencies.summary() for route, latencies in self.latencies.items()},
+        }
+
+
+    async def route(self, method, target):
+        """
+        Works out the response to one request. Returns (route, status, content type, body).
+        """
+        url = urlsplit(target)
+        parts = [part for part in url.path.split('/') if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if method != 'GET':
+            return 'other', 400, 'application/json', {'error': f'{method} is not supported'}
+
+        if parts == ['board']:
+            difficulty = query.get('difficulty', 'medium')
+            try:
+                m, n = parse_size(query.get('size', '{}x{}'.format(*self.initial_sizes[0])))
+            except ValueError as e:
+                return 'board', 400, 'application/json', {'error': str(e)}
+            if (m, n) not in self.initial_sizes:
+                sizes = ", ".join(f"{m}x{n}" for m, n in self.initial_sizes)
+                return 'board', 400, 'application/json', {'error': f'size must be one of {sizes}'}
+            if difficulty not in DIFFICULTIES:
+                return 'board', 400, 'application/json', {'error': f'difficulty must be one of {", ".join(DIFFICULTIES)}'}
+
+            b = await self.take(m, n, difficulty)
+            if b is None:
+                return 'board', 503, 'application/json', {'error': 'Could not generate a board'}
+            return 'board', 200, 'application/json', self.board_json(self.remember(b, difficulty))
+
+        if parts == ['metrics']:
+            return 'metrics', 200, 'application/json', self.metrics()
+
+        if len(parts) >= 2 and parts[0] == 'boards':
+            board_id = parts[1][:-4] if parts[1].endswith('.png') and len(parts) == 2 else parts[1]
+            if board_id not in self.served:
+                return 'boards', 404, 'application/json', {'error': f'No board {board_id}'}
+
+            if len(parts) == 2 and parts[1].endswith('.png'):
+                return 'image', 200, 'image/png', await self.image(board_id, False)
+            if parts[2:] == ['solution.png']:
+                return 'image', 200, 'image/png', await self.image(board_id, True)
+            if parts[2:] == ['solution']:
+                return 'solution', 200, 'application/json', {'id': board_id, 'path': self.served[board_id][0].path}
+            if len(parts) == 2:
+                return 'boards', 200, 'application/json', self.board_json(board_id)
+
+        return 'other', 404, 'application/json', {'error': f'Nothing at {url.path}'}
+
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves the requests of one connection in turn, keeping it open unless the client asks not to.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                started = time.perf_counter()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    break
+
+                route, status, content_type, body = await self.route(method, target)
+                if content_type == 'application/json':
+                    body = json.dumps(body).encode()
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                writer.write(
+                    f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                    f'Content-Type: {content_type}\r\n'
+                    f'Content-Length: {len(body)}\r\n'
+                    f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+                    '\r\n'.encode() + body
+                )
+                await writer.drain()
+
+                if route not in self.latencies:
+                    self.latencies[route] = Latencies()
+                self.latencies[route].add((time.perf_counter() - started) * 1000)
+
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+    def close(self):
+        for task in self.refills.values():
+            task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def serve(host, port, sizes, depth, workers, seed):
+    server = PuzzleServer(sizes, depth=depth, workers=workers, seed=seed)
+    await server.start(host, port)
+    print(f'Serving {", ".join(f"{m}x{n}" for m, n in sizes)} boards on http://{host}:{port}', flush=True)
+    try:
+        await server.server.serve_forever()
+    finally:
+        server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve fresh boards over HTTP from a pool generated in the background.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--sizes", default="8x8,10x10", help="Sizes to serve, each with its own pools, e.g. 8x8,10x10. Other sizes are refused.")
+    parser.add_argument("--depth", type=int, default=32, help="Boards kept ready per size and difficulty.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes. Defaults to one per core.")
+    parser.add_argument("--seed", type=int, default=None, help="Base seed, random by default.")
+    args = parser.parse_args()
+
+    sizes = [parse_size(size) for size in args.sizes.split(',')]
+    try:
+        asyncio.run(serve(args.host, args.port, sizes, args.depth, args.workers, args.seed))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from PIL import Image, ImageDraw, ImageFont, ImageFilter
+# matplotlib is only needed for the colours of a palette, and takes longer to import than everything else 
+# here together, so it is imported the first time a palette is made.
+
+
+# Fonts tried in order when no font path is given. If none of them exist the font bundled with Pillow is used.
+FONT_PATHS = [
+    "/Library/Fonts/Arial Unicode.ttf", # macOS
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", # Debian, Ubuntu
+    "/usr/share/fonts/dejavu-sans-fonts/DejaVuSans.ttf", # Fedora
+]
+
+
+def load_font(size, font_path=None):
+    """
+    Loads the font at font_path, or the first of FONT_PATHS that exists, at the given size.
+    Falls back to the font bundled with Pillow.
+    """
+    for path in [font_path] if font_path is not None else FONT_PATHS:
+        try:
+            return ImageFont.truetype(path, size=size)
+        except OSError:
+            continue
+
+    if font_path is not None:
+        raise OSError(f"Could not load the font {font_path}")
+
+    return ImageFont.load_default(size=size)
+
+
+def add_drop_shadow(image, offset=(5, 5), background_color=0xffffff, shadow_color=0x000000, border=10, iterations=5):
+    total_width = image.width + abs(offset[0]) + 2 * border
+    total_height = image.height + abs(offset[1]) + 2 * border
+    shadow = Image.new(image.mode, (total_width, total_height), background_color)
+
+    shadow_left = border + max(offset[0], 0)
+    shadow_top = border + max(offset[1], 0)
+
+    shadow.paste(shadow_color, [shadow_left, shadow_top, shadow_left + image.width, shadow_top + image.height])
+
+    for _ in range(iterations):
+        shadow = shadow.filter(ImageFilter.BLUR)
+
+    img = Image.new(image.mode, (total_width, total_height), background_color)
+    img.paste(shadow, (0, 0))
+    img.paste(image, (border, border))
+
+    return img
+
+
+class BoardRenderer:
+    """
+    Draws boards as images. The fonts are loaded once, the colour of every number is worked out
+    once per max_distance and the blurred drop shadow once per board size, so drawing a board
+    only has to draw its cells and text.
+    """
+
+    def __init__(self, font_path=None, cell_size=100, colormap='Blues', shadow_offset=(10, 10), shadow_border=20):
+        self.cell_size = cell_size  # Size of each cell in pixels
+        self.colormap = colormap  # Try different colormaps here
+        self.shadow_offset = shadow_offset
+        self.shadow_border = shadow_border
+
+        self.font = load_font(30, font_path)
+        self.small_font = load_font(20, font_path)
+
+        self.palettes = {} # max_distance -> colour of every number from 0 to max_distance + 1
+        self.shadows = {} # (m, n) -> blurred shadow the board is pasted onto
+
+
+    def palette(self, max_distance):
+        if max_distance not in self.palettes:
+            from matplotlib import colormaps
+            from matplotlib.colors import Normalize
+
+            norm = Normalize(vmin=0, vmax=max_distance + 1)
+            colormap = colormaps[self.colormap]
+            palette = []
+            for number in range(max_distance + 2):
+                rgba = colormap(norm(number))
+                palette.append('#{:02x}{:02x}{:02x}'.format(int(rgba[0]*255), int(rgba[1]*255), int(rgba[2]*255)))
+            self.palettes[max_distance] = palette
+
+        return self.palettes[max_distance]
+
+
+    def number_to_color(self, number, max_distance):
+        if type(number) == str:
+            number = 0
+
+        palette = self.palette(max_distance)
+        return palette[min(number, len(palette) - 1)]
+
+
+    def shadow(self, m, n):
+        """
+        The drop shadow for an m x n board, blurred the first time it is needed.
+        """
+        if (m, n) not in self.shadows:
+            blank = Image.new('RGB', (n * self.cell_size, m * self.cell_size), color='white')
+            self.shadows[(m, n)] = add_drop_shadow(blank, offset=self.shadow_offset, shadow_color="black", border=self.shadow_border)
+
+        return self.shadows[(m, n)]
+
+
+    def draw_cell(self, draw, number, color, i, j, outline_color="black", outline_width=2):
+        cell_size = self.cell_size
+        top_left_corner = (j * cell_size, i * cell_size)
+        bottom_right_corner = ((j + 1) * cell_size, (i + 1) * cell_size)
+        x0, y0 = top_left_corner
+        x1, y1 = bottom_right_corner
+
+        # Draw the rounded rectangle with an outline for path cells
+        draw.rounded_rectangle([x0, y0, x1, y1], radius=20, fill=color, outline=outline_color, width=outline_width)
+
+        text_position = (j * cell_size + cell_size // 2, i * cell_size + cell_size // 2)
+        draw.text(text_position, str(number), fill="black", font=self.font, anchor="mm")
+
+
+    def render_base(self, board):
+        """
+        Draws the cells of a Board, without the drop shadow or the path.
+        """
+        img = Image.new('RGB', (board.n * self.cell_size, board.m * self.cell_size), color='white')
+        draw = ImageDraw.Draw(img)
+
+        rows = board.board
+        for i in range(board.m):
+            for j in range(board.n):
+                number = rows[i][j]
+                self.draw_cell(draw, number, self.number_to_color(number, board.max_distance), i, j)
+
+        return img
+
+
+    def overlay_path(self, board, base):
+        """
+        Returns a copy of an image from render_base with the path of the board marked on it. 
+        Only the path cells are drawn again.
+        """
+        img = base.copy()
+        draw = ImageDraw.Draw(img)
+
+        rows = board.board
+        for x, y in board.path:
+            number = rows[x][y]
+            self.draw_cell(draw, number, self.number_to_color(number, board.max_distance), x, y, outline_color="yellow", outline_width=5)
+
+        cell_size = self.cell_size
+        for index, (x, y) in enumerate(board.path):
+            # Draw the sequential number in the top-right corner of each square
+            number_position = (y * cell_size + cell_size - 25, x * cell_size + 15)
+            draw.text(number_position, str(index + 1), fill="yellow", font=self.small_font, anchor="mm")
+
+        return img
+
+
+    def with_shadow(self, board, img):
+        out = self.shadow(board.m, board.n).copy()
+        out.paste(img, (self.shadow_border, self.shadow_border))
+        return out
+
+
+    def render(self, board, show_path=False):
+        """
+        Returns the image of a Board, with the path marked on it if show_path is set.
+        """
+        img = self.render_base(board)
+        if show_path:
+            img = self.overlay_path(board, img)
+        return self.with_shadow(board, img)
+
+
+    def render_pair(self, board):
+        """
+        Returns the images of a Board without and with its path, drawing the cells only once.
+        """
+        base = self.render_base(board)
+        return self.with_shadow(board, base), self.with_shadow(board, self.overlay_path(board, base))
+
+
+    def save(self, board, board_filename=None, solution_filename=None, compress_level=6, optimize=False):
+        """
+        Saves the board image and/or the solution image of a Board as PNG files. compress_level goes
+        from 0 (fastest, biggest) to 9 (slowest, smallest) and optimize asks for the smallest file.
+        """
+        if solution_filename is None:
+            images = [(self.render(board), board_filename)]
+        elif board_filename is None:
+            images = [(self.render(board, show_path=True), solution_filename)]
+        else:
+            images = zip(self.render_pair(board), [board_filename, solution_filename])
+
+        for img, filename in images:
+            img.save(filename, compress_level=compress_level, optimize=optimize)
+
+
+_default_renderer = None
+
+def default_renderer():
+    """
+    The renderer shared by Board.create_board_image, made on first use.
+    """
+    global _default_renderer
+    if _default_renderer is None:
+        _default_renderer = BoardRenderer()
+    return _default_renderer
+
+
+def _save_job(job):
+    board, board_filename, solution_filename, compress_level, optimize = job
+    default_renderer().save(board, board_filename, solution_filename, compress_level=compress_level, optimize=optimize)
+    return board_filename, solution_filename
+
+
+def render_many(jobs, workers=None, threads=False, compress_level=6, optimize=False):
+    """
+    Saves the images for many boards at once. jobs is a list of (board, board_filename, solution_filename) 
+    where either filename may be None. The work is spread over a process pool, or a thread pool if 
+    threads is set, with one renderer per process. Yields the filenames of every job as it finishes.
+    """
+    jobs = [(board, board_filename, solution_filename, compress_level, optimize) for board, board_filename, solution_filename in jobs]
+
+    if workers == 1:
+        yield from map(_save_job, jobs)
+        return
+
+    executor = ThreadPoolExecutor(workers) if threads else ProcessPoolExecutor(workers)
+    with executor:
+        futures = [executor.submit(_save_job, job) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
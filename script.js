@@ -1,33 +1,126 @@
-// Generate options for the puzzle number dropdown
-document.addEventListener("DOMContentLoaded", function () {
+// Every puzzle, its path and its images, loaded once from the manifest written by build_site.py
+let manifest = null;
+
+// Without a manifest, as when the page is served from the repository itself, the puzzles are read
+// straight from the text files and PNGs in boards/, one request per puzzle shown.
+const FALLBACK_DIFFICULTIES = ["Easy", "Medium", "Hard"];
+const FALLBACK_PUZZLES = 35;
+
+function fallbackManifest() {
+	const puzzles = [];
+	for (let i = 1; i <= FALLBACK_PUZZLES; i++) {
+		puzzles.push({ number: i });
+	}
+	return {
+		difficulties: FALLBACK_DIFFICULTIES.map((name) => ({ key: name.toLowerCase(), name: name, folder: `boards/${name}`, puzzles: puzzles })),
+	};
+}
+
+async function loadManifest() {
+	// The manifest is gzipped. Browsers that can't unzip it themselves get the plain copy.
+	if ("DecompressionStream" in window) {
+		try {
+			const response = await fetch("manifest.json.gz");
+			if (response.ok) {
+				const stream = response.body.pipeThrough(new DecompressionStream("gzip"));
+				return await new Response(stream).json();
+			}
+		} catch (error) {
+			console.error("Error unzipping the manifest:", error);
+		}
+	}
+
+	const response = await fetch("manifest.json");
+	if (!response.ok) {
+		throw new Error("Manifest not found.");
+	}
+	return response.json();
+}
+
+function selectedDifficulty() {
+	const key = document.getElementById("difficulty").value;
+	return manifest.difficulties.find((difficulty) => difficulty.key === key);
+}
+
+// Generate options for the difficulty and puzzle number dropdowns
+function fillPuzzleNumbers() {
 	const puzzleNumberDropdown = document.getElementById("puzzleNumber");
+	puzzleNumberDropdown.innerHTML = "";
 
-	for (let i = 1; i <= 35; i++) {
+	for (const puzzle of selectedDifficulty().puzzles) {
 		let option = document.createElement("option");
-		option.value = i;
-		option.textContent = i;
+		option.value = puzzle.number;
+		option.textContent = puzzle.number;
 		puzzleNumberDropdown.appendChild(option);
 	}
+}
+
+document.addEventListener("DOMContentLoaded", async function () {
+	try {
+		manifest = await loadManifest();
+	} catch (error) {
+		console.error("Error loading the manifest, reading boards/ instead:", error);
+		manifest = fallbackManifest();
+	}
+
+	const difficultyDropdown = document.getElementById("difficulty");
+	difficultyDropdown.innerHTML = "";
+	for (const difficulty of manifest.difficulties) {
+		let option = document.createElement("option");
+		option.value = difficulty.key;
+		option.textContent = difficulty.name;
+		difficultyDropdown.appendChild(option);
+	}
+
+	difficultyDropdown.addEventListener("change", fillPuzzleNumbers);
+	fillPuzzleNumbers();
 });
 
+function pictureHTML(image) {
+	const srcset = image.webp.map(([filename, width]) => `${filename} ${width}w`).join(", ");
+	return `<picture>
+		<source type="image/webp" srcset="${srcset}" sizes="(max-width: 800px) 100vw, 800px">
+		<img src="${image.png}" width="${image.width}" height="${image.height}" alt="Puzzle Image" style="max-width: 100%; height: auto;">
+	</picture>`;
+}
+
 function showPuzzle() {
-	const difficulty = document.getElementById("difficulty").value;
-	const puzzleNumber = document.getElementById("puzzleNumber").value;
+	if (manifest === null) {
+		return;
+	}
+
+	const puzzleNumber = Number(document.getElementById("puzzleNumber").value);
 	const showSolution = document.getElementById("showSolution").checked;
+	const difficulty = selectedDifficulty();
+	const puzzle = difficulty.puzzles.find((p) => p.number === puzzleNumber);
 
-	const puzzleContainer = document.getElementById("puzzleContainer");
+	if (difficulty.folder !== undefined) {
+		showFallbackPuzzle(difficulty.folder, puzzleNumber, showSolution);
+		return;
+	}
+
+	// Pick the image based on whether the solution is being shown
+	const image = showSolution ? puzzle.images.solution : puzzle.images.board;
+	document.getElementById("puzzleContainer").innerHTML = pictureHTML(image);
+
+	// The same text the board and path files hold
+	document.getElementById("textContainer").textContent = showSolution
+		? puzzle.path.map(([i, j]) => `${i} ${j}\n`).join("")
+		: puzzle.board;
+}
 
+function showFallbackPuzzle(folder, puzzleNumber, showSolution) {
 	// Determine the image path based on whether the solution is being shown
 	const imagePath = showSolution
-		? `boards/${difficulty}/jumping_julia_solution_${puzzleNumber}.png`
-		: `boards/${difficulty}/jumping_julia_board_${puzzleNumber}.png`;
+		? `${folder}/jumping_julia_solution_${puzzleNumber}.png`
+		: `${folder}/jumping_julia_board_${puzzleNumber}.png`;
 
-	puzzleContainer.innerHTML = `<img src="${imagePath}" alt="Puzzle Image" style="max-width: 100%; height: auto;">`;
+	document.getElementById("puzzleContainer").innerHTML = `<img src="${imagePath}" alt="Puzzle Image" style="max-width: 100%; height: auto;">`;
 
 	// Determine the text file path based on the selections
 	const textFilePath = showSolution
-		? `boards/${difficulty}/jumping_julia_path_${puzzleNumber}.txt`
-		: `boards/${difficulty}/jumping_julia_board_${puzzleNumber}.txt`;
+		? `${folder}/jumping_julia_path_${puzzleNumber}.txt`
+		: `${folder}/jumping_julia_board_${puzzleNumber}.txt`;
 
 	// Load the text file content into the textContainer
 	fetch(textFilePath)
@@ -1,27 +1,58 @@
-import random
+import argparse
+import os
+import sys
+import time
+from multiprocessing import Pool
 
+import numpy as np
 
-class Chessboard:
-    def __init__(self):
-        self.board = [['?' for _ in range(8)] for _ in range(8)]
+from chess_moves import GOAL, move_table, squares
+from chess_solver import Chessboard as Solver
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # For generation.py, shared with logic.py
+from generation import BatchedDraws, GenerationError, in_random_order
+
+
+class Chessboard(BatchedDraws):
+    def __init__(self, m=8, n=8, seed=None):
+        self.m = m
+        self.n = n
+        self.moves = move_table(m, n)
+        self.board = [['?' for _ in range(n)] for _ in range(m)]
         self.path = []
+        self.dud_squares = [] # Squares the last fill found no safe piece for.
+        self.difficulty_bias = 0.25
+
+        self.start_draws(seed)
+
+
+    def __getstate__(self):
+        # Boards come back from worker processes pickled, without the shared move table, which can
+        # be rebuilt, or the draws they didn't use.
+        state = super().__getstate__()
+        del state['moves']
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.moves = move_table(self.m, self.n)
 
 
     def __str__(self):
         return "\n".join(" ".join(f'{cell: <5}' for cell in row) for row in self.board)
 
 
+    def choice(self, options):
+        return options[int(self.uniforms(1)[0] * len(options))]
+
+
     def check_valid(self):
         """Checks if the board is valid."""
         
-        for i in range(8):
-            for j in range(8):
-                piece = self.board[i][j]
-                if piece in ['p', 'k', 'X']:
-                    continue
-                elif piece[0] in ['r', 'q', 'b'] and piece[1] in ['1', '2', '3', '4', '5', '6']:
-                    continue
-                else:
+        for row in self.board:
+            for piece in row:
+                if piece != GOAL and piece not in self.moves.targets:
                     return False
                 
         return True
@@ -29,157 +60,265 @@ class Chessboard:
 
     def neighbors(self, square, piece, difficulty_bias=1):
         """
-        List of neighbors of a square given the piece that the square has.
+        List of neighbors of a square given the piece that the square has. Unless difficulty_bias allows
+        it, only the moves that head towards 'X' are counted.
         """
         
         x, y = square
- 
-        # Pawn movement
-        if piece[0] == 'p':
-            if random.random() < difficulty_bias:
-                out = [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]
-            else:
-                out = [(x + 1, y), (x, y + 1)]
+        index = x * self.n + y
+        if self.uniforms(1)[0] < difficulty_bias:
+            mask = self.moves.targets[piece][index]
+        else:
+            mask = self.moves.forward[piece][index]
 
-        # Knight movement
-        elif piece[0] == 'k':
-            if random.random() < difficulty_bias:
-                out = [(x + 1, y + 2), (x - 1, y + 2), (x + 1, y - 2), (x - 1, y - 2), (x + 2, y + 1), (x - 2, y + 1), (x + 2, y - 1), (x - 2, y - 1)]
-            else:
-                out = [(x + 1, y + 2), (x - 1, y + 2), (x + 2, y + 1), (x + 2, y - 1)]
-        
-        # Rook movement
-        elif piece[0] == 'r':
-            stride = int(piece[1])
-            if random.random() < difficulty_bias:
-                out = [(x + stride, y), (x - stride, y), (x, y + stride), (x, y - stride)]
-            else:
-                out = [(x + stride, y), (x, y + stride)]
-
-        # Bishop movement
-        elif piece[0] == 'b':
-            stride = int(piece[1])
-            if random.random() < difficulty_bias:
-                out = [(x + stride, y + stride), (x - stride, y - stride), (x + stride, y - stride), (x - stride, y + stride)]
-            else:
-                out = [(x + stride, y + stride)]
-        
-        # Queen movement
-        elif piece[0] == 'q':
-            stride = int(piece[1])
-            if random.random() < difficulty_bias:
-                out = [(x + stride, y), (x - stride, y), (x, y + stride), (x, y - stride), (x + stride, y + stride), (x - stride, y - stride), (x + stride, y - stride), (x - stride, y + stride)]
-            else:
-                out = [(x + stride, y), (x + stride, y + stride), (x, y + stride)]
-        
-        # Removing invalid moves
-        return [(i, j) for i, j in out if 0 <= i < 8 and 0 <= j < 8]
+        return [self.moves.coords[target] for target in squares(mask)]
         
 
     def all_neighbors_and_pieces(self, square, shuffled=True, difficulty_bias=1):
         """
         Returns a list of all possible neighbors of a cell along with a list of what 
         chesspieces that square will have to house to get that neighbor. In the format --
-        [ (neigbor:tup, pieces:list) ]
+        [ (neigbor:tup, pieces:tuple) ]
+        Moves towards 'X' are always included, each of the others with probability difficulty_bias.
         """
         
         x, y = square
+        index = x * self.n + y
+        coords = self.moves.coords
 
-        out = [
-            ((x + 1, y), ['p', 'r1', 'q1']), # Right 1
-            ((x, y + 1), ['p', 'r1', 'q1']), # Down 1
-            ((x + 1, y + 1), ['p', 'b1', 'q1']), # Right 1, Down 1
-            ((x + 1, y + 2), ['k']), # Right 1, Down 2
-            ((x + 2, y + 1), ['k']), # Right 2, Down 1
-            ((x - 1, y + 2), ['k']), # Left 1, Down 2
-            ((x + 2, y - 1), ['k']), # Right 2, Up 1
-        ]   
-        maybe = [
-            ((x - 1, y), ['p', 'r1', 'q1']), # Left 1
-            ((x, y - 1), ['p', 'r1', 'q1']), # Up 1
-            ((x - 1, y - 1), ['p', 'b1', 'q1']), # Left 1, Up 1
-            ((x + 1, y - 1), ['p', 'b1', 'q1']), # Right 1, Up 1
-            ((x - 1, y + 1), ['p', 'b1', 'q1']), # Left 1, Down 1
-            ((x - 2, y + 1), ['k']), # Left 2, Down 1
-            ((x + 1, y - 2), ['k']), # Right 1, Up 2
-            ((x - 1, y - 2), ['k']), # Left 1, Up 2
-            ((x - 2, y - 1), ['k']), # Left 2, Up 1
-        ]
-
-        for stride in range(2, 7):
-            out.extend([
-                ((x + stride, y), ['r' + str(stride), 'q' + str(stride)]), # Right stride
-                ((x, y + stride), ['r' + str(stride), 'q' + str(stride)]), # Down stride
-                ((x + stride, y + stride), ['b' + str(stride), 'q' + str(stride)]), # Right stride, Down stride
-            ])
-
-            maybe.extend([
-                ((x - stride, y), ['r' + str(stride), 'q' + str(stride)]), # Left stride
-                ((x, y - stride), ['r' + str(stride), 'q' + str(stride)]), # Up stride
-                ((x - stride, y - stride), ['b' + str(stride), 'q' + str(stride)]), # Left stride, Up stride
-                ((x + stride, y - stride), ['b' + str(stride), 'q' + str(stride)]), # Right stride, Up stride
-                ((x - stride, y + stride), ['b' + str(stride), 'q' + str(stride)]), # Left stride, Down stride
-            ])
-
-        for move in maybe:
-            if random.random() < difficulty_bias:
-                out.append(move)
-
-        # Removing invalid moves
-        out = [(n, p) for n, p in out if 0 <= n[0] < 8 and 0 <= n[1] < 8]
+        out = [(coords[target], pieces) for target, pieces in self.moves.forward_steps[index]]
+        backward = self.moves.backward_steps[index]
+        # One draw per backward step for the bias, then one per step for the shuffle.
+        draws = self.uniforms(2 * len(backward) + len(out))
+        if difficulty_bias >= 1:
+            out.extend((coords[target], pieces) for target, pieces in backward)
+        elif difficulty_bias > 0:
+            for (target, pieces), draw in zip(backward, draws):
+                if draw < difficulty_bias:
+                    out.append((coords[target], pieces))
 
         if shuffled:
-            random.shuffle(out)
+            out = in_random_order(out, draws[len(backward):])
 
         return out
 
 
-    def create_random_path(self, difficulty_bias=0.25):
-        self.path = []
-        path_pieces = []
+    def create_random_path(self, difficulty_bias=0.25, max_restarts=None, max_backtracks=None, timeout=None, verbose=False):
+        """
+        Walks a random path from the top left square to 'X' and puts on every square of it a piece
+        that moves to the next one. No square of the path may be reachable from an earlier square
+        other than the one just before it, so the path can't be cut short. The walk backtracks out 
+        of dead ends and starts over when it backs up to the start. Raises GenerationError when it 
+        needs more than max_restarts restarts or max_backtracks backtracks, or runs for longer than 
+        timeout seconds. None means no limit. verbose prints the state of the walk at every step.
+        """
+        self.difficulty_bias = difficulty_bias
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        moves = self.moves
+        goal = moves.goal
+        restarts = 0
+        backtracks = 0
 
-        current_square = (0, 0)
+        while True:
+            path = []
+            path_pieces = [] # path_pieces[k] is the piece on path[k], the one that moves to the square after it.
 
-        bad_squares = []
-        affected_squares = []
+            current_square = moves.start
 
-        while current_square != (7, 7):
-            
-            print(f'Path: {self.path}\nCurrent Square: {current_square}\nAffected Squares: {affected_squares}\nBad Squares: {bad_squares}\nPath Pieces: {path_pieces}\n')
-            
-            possible_neighbors = self.all_neighbors_and_pieces(current_square, difficulty_bias=difficulty_bias)
-            for neighbor, pieces in possible_neighbors: #TODO here
-                
-                # Found next square if it is 
-                # 1) A new square ie not in the path
-                # 2) Not a bad square ie has neighbors that are not in the path
-                # 3) Does not touch the path with a certain distance
-                if neighbor not in bad_squares and all(neighbor not in as_ for as_ in affected_squares):
-                    next_square = neighbor
-                    next_to_piece = random.choice(pieces)
-                    bad_squares = []
-                    break
+            # Sets of squares as bitmasks, one per square of the path so far, so every check is one &.
+            # covered[-1] holds the squares the path can already reach, starting with the start itself 
+            # so the path never comes back to it. bad[-1] holds the dead ends found while the path 
+            # before them is kept, a mark is dropped when the walk backs up past the square it was found from.
+            covered = [1 << current_square]
+            bad = [0]
+
+            while current_square != goal:
+                if verbose:
+                    print(f'Path: {path}\nCurrent square: {current_square}\nPath pieces: {path_pieces}\nBad squares: {squares(bad[-1])}\n')
+
+                blocked = covered[-1] | bad[-1]
+                for neighbor, pieces in self.all_neighbors_and_pieces(moves.coords[current_square], difficulty_bias=difficulty_bias):
+                    neighbor = neighbor[0] * self.n + neighbor[1]
+                    if blocked >> neighbor & 1:
+                        continue
+
+                    # The piece must not also be able to jump straight to 'X'.
+                    pieces = [piece for piece in pieces if neighbor == goal or not moves.targets[piece][current_square] >> goal & 1]
+                    if pieces:
+                        next_square = neighbor
+                        next_piece = self.choice(pieces)
+                        break
+
+                # If no new square is found, undo the last step in the path.
+                else:
+                    if not path:
+                        break # Start over.
+
+                    backtracks += 1
+                    if max_backtracks is not None and backtracks > max_backtracks:
+                        self.restarts, self.backtracks = restarts, backtracks
+                        raise GenerationError(f'No path found for a {self.m}x{self.n} board within {max_backtracks} backtracks.')
+                    if deadline is not None and time.perf_counter() > deadline:
+                        self.restarts, self.backtracks = restarts, backtracks
+                        raise GenerationError(f'No path found for a {self.m}x{self.n} board within {timeout} seconds.')
+
+                    bad.pop()
+                    bad[-1] |= 1 << current_square
+                    current_square = path.pop()
+                    path_pieces.pop()
+                    covered.pop()
+                    continue
+
+                path.append(current_square)
+                path_pieces.append(next_piece)
+                covered.append(covered[-1] | moves.targets[next_piece][current_square])
+                bad.append(bad[-1])
+                current_square = next_square
 
             else:
-                if not path_pieces:
-                    return self.create_random_path(difficulty_bias=difficulty_bias)
+                break # Reached the goal.
+
+            restarts += 1
+            if max_restarts is not None and restarts > max_restarts:
+                self.restarts, self.backtracks = restarts, backtracks
+                raise GenerationError(f'No path found for a {self.m}x{self.n} board within {max_restarts} restarts.')
+            if deadline is not None and time.perf_counter() > deadline:
+                self.restarts, self.backtracks = restarts, backtracks
+                raise GenerationError(f'No path found for a {self.m}x{self.n} board within {timeout} seconds.')
+
+        self.restarts, self.backtracks = restarts, backtracks
+
+        # Mark all the squares in the path, each with its own piece
+        self.board = [['?' for _ in range(self.n)] for _ in range(self.m)]
+        path.append(goal)
+        path_pieces.append(GOAL)
+        for square, piece in zip(path, path_pieces):
+            i, j = moves.coords[square]
+            self.board[i][j] = piece
+        self.path = [moves.coords[square] for square in path]
+
 
-                bad_squares.append(current_square)
-                current_square = self.path.pop()
-                affected_squares.pop()
-                path_pieces.pop()
+    def fill_remaining_squares(self, max_rounds=10):
+        """
+        Puts a piece on every square off the path. Each square gets a random piece out of the ones
+        that can't move onto the path, so nothing off the path leads back to it. Squares where every
+        piece hits the path (dud_squares) get any piece and are re-rolled until the solver finds the
+        path to be the only solution, at most max_rounds times. Returns True if it is.
+        """
+        moves = self.moves
+        on_path = 0
+        for i, j in self.path:
+            on_path |= 1 << (i * self.n + j)
+
+        self.dud_squares = []
+        draws = self.uniforms(moves.size) # One per square, for the piece it gets.
+        for square in range(moves.size):
+            if on_path >> square & 1:
                 continue
+            i, j = moves.coords[square]
+            safe = [piece for piece in moves.pieces if not moves.targets[piece][square] & on_path]
+            if not safe:
+                safe = moves.pieces
+                self.dud_squares.append((i, j))
+            self.board[i][j] = safe[int(draws[square] * len(safe))]
+
+        for _ in range(max_rounds):
+            if self.is_unique():
+                return True
+            for (i, j), draw in zip(self.dud_squares, self.uniforms(len(self.dud_squares))):
+                self.board[i][j] = moves.pieces[int(draw * len(moves.pieces))]
+
+        return self.is_unique()
+
+
+    def is_unique(self):
+        """
+        Checks with the solver that the path is the one and only solution of the board.
+        """
+        path, count = Solver(self.board).solve(cap=2)
+        return count == 1 and path == self.path
+
+
+    def generate(self, difficulty_bias=0.25, max_restarts=None, timeout=None, verbose=False):
+        """
+        Makes a complete puzzle: a path, the squares around it filled and the solution checked to be unique.
+        Starts over with a new path when the fill can't be made unique. Raises GenerationError when 
+        that happens more than max_restarts times, or the whole board takes longer than timeout seconds.
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        self.fill_restarts = 0
+
+        while True:
+            self.create_random_path(
+                difficulty_bias=difficulty_bias, max_restarts=max_restarts, verbose=verbose,
+                timeout=None if deadline is None else max(deadline - time.perf_counter(), 0),
+            )
+            if self.fill_remaining_squares():
+                return self
+
+            self.fill_restarts += 1
+            if max_restarts is not None and self.fill_restarts > max_restarts:
+                raise GenerationError(f'Could not fill a {self.m}x{self.n} board within {max_restarts} restarts.')
+            if deadline is not None and time.perf_counter() > deadline:
+                raise GenerationError(f'Could not fill a {self.m}x{self.n} board within {timeout} seconds.')
+
+
+def make_board(task):
+    """
+    Generates the board for one index of a batch from its own seed. Runs in a worker process.
+    """
+    index, m, n, difficulty_bias, seed, max_restarts, timeout = task
+    cb = Chessboard(m, n, seed=np.random.SeedSequence([seed, index]))
+    try:
+        cb.generate(difficulty_bias=difficulty_bias, max_restarts=max_restarts, timeout=timeout)
+    except GenerationError:
+        return index, None
+    return index, cb
+
+
+def generate_boards(count, m=8, n=8, difficulty_bias=0.25, seed=0, workers=1, max_restarts=None, timeout=None):
+    """
+    Generates count puzzles and returns them in order with the boards per second it managed. 
+    Boards that run out of budget are left out. workers=None uses every core.
+    """
+    tasks = [(index, m, n, difficulty_bias, seed, max_restarts, timeout) for index in range(count)]
+
+    started = time.perf_counter()
+    if workers == 1:
+        results = list(map(make_board, tasks))
+    else:
+        with Pool(workers) as pool:
+            results = pool.map(make_board, tasks, chunksize=max(1, count // 64))
+    elapsed = time.perf_counter() - started
+
+    boards = [cb for index, cb in results if cb is not None]
+    return boards, len(boards) / elapsed if elapsed else float('inf')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate chess variant puzzles.")
+    parser.add_argument("m", type=int, nargs="?", default=8)
+    parser.add_argument("n", type=int, nargs="?", default=8)
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--difficulty-bias", type=float, default=0.25)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds allowed per board.")
+    parser.add_argument("--verbose", action="store_true", help="Print every step of the path search.")
+    args = parser.parse_args()
 
-            self.path.append(next_square)
-            affected_squares.append(self.neighbors(current_square, next_to_piece))
-            path_pieces.append(next_to_piece)
-            current_square = next_square
+    if args.verbose:
+        print(Chessboard(args.m, args.n, seed=np.random.SeedSequence([args.seed, 0])).generate(difficulty_bias=args.difficulty_bias, verbose=True))
+        return
 
-        # Mark all the squares in the path
-        for square, piece in zip(self.path, path_pieces):
-            self.board[square[0]][square[1]] = piece
+    boards, rate = generate_boards(
+        args.count, args.m, args.n, difficulty_bias=args.difficulty_bias, seed=args.seed, 
+        workers=args.workers, timeout=args.timeout,
+    )
+    for cb in boards[:3]:
+        print(cb, end='\n\n')
+    print(f'{len(boards)}/{args.count} boards, {rate:.1f} boards/s')
 
 
-cb = Chessboard()
-cb.create_random_path()
-print(cb)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Move tables for the chess board variant, shared by the generator in chess_logic.py and the solver in chess_solver.py.
+
+Squares are numbered row-major as i * n + j and a set of squares is an int with bit i * n + j set for each of them.
+A piece is a string: 'p' (pawn, one square orthogonally), 'k' (knight) or a rook, bishop or queen with the
+length of its move, e.g. 'r3', 'b2', 'q5'.
+"""
+
+
+GOAL = 'X'
+
+
+def piece_offsets(piece):
+    """
+    The (di, dj) of every move a piece makes.
+    """
+    kind = piece[0]
+    if kind == 'p':
+        return [(1, 0), (-1, 0), (0, 1), (0, -1)]
+    if kind == 'k':
+        return [(1, 2), (-1, 2), (1, -2), (-1, -2), (2, 1), (-2, 1), (2, -1), (-2, -1)]
+
+    stride = int(piece[1:])
+    orthogonal = [(stride, 0), (-stride, 0), (0, stride), (0, -stride)]
+    diagonal = [(stride, stride), (-stride, -stride), (stride, -stride), (-stride, stride)]
+    if kind == 'r':
+        return orthogonal
+    if kind == 'b':
+        return diagonal
+    if kind == 'q':
+        return orthogonal + diagonal
+    raise ValueError(f"Unknown piece {piece!r}")
+
+
+def squares(mask):
+    """
+    The squares in a bitmask, lowest first.
+    """
+    out = []
+    while mask:
+        low = mask & -mask
+        out.append(low.bit_length() - 1)
+        mask ^= low
+    return out
+
+
+class MoveTable:
+    """
+    Every move of every piece from every square of an m x n board, worked out once. targets[piece][square]
+    is the bitmask of squares the piece can move to and forward[piece][square] the part of it that heads
+    towards 'X' (di + dj > 0), which is what the generator always allows. Rooks, bishops and queens go up
+    to max_stride squares, by default two less than the longest side. Use move_table() to get the copy
+    shared between boards.
+    """
+
+    def __init__(self, m, n, max_stride=None):
+        self.m = m
+        self.n = n
+        self.size = m * n
+        self.start = 0
+        self.goal = self.size - 1
+        self.max_stride = max(max(m, n) - 2, 1) if max_stride is None else max_stride
+
+        self.pieces = ['p', 'k'] + [kind + str(stride) for kind in 'rbq' for stride in range(1, self.max_stride + 1)]
+        self.coords = tuple((i, j) for i in range(m) for j in range(n))
+
+        self.targets = {GOAL: [0] * self.size}
+        self.forward = {GOAL: [0] * self.size}
+        for piece in self.pieces:
+            offsets = piece_offsets(piece)
+            targets = []
+            forward = []
+            for i, j in self.coords:
+                mask = 0
+                ahead = 0
+                for di, dj in offsets:
+                    if 0 <= i + di < m and 0 <= j + dj < n:
+                        bit = 1 << ((i + di) * n + j + dj)
+                        mask |= bit
+                        if di + dj > 0:
+                            ahead |= bit
+                targets.append(mask)
+                forward.append(ahead)
+            self.targets[piece] = targets
+            self.forward[piece] = forward
+
+        # Candidate steps for the path generator, as (target, pieces) with every piece that can make the step.
+        # forward_steps[c] is always on offer and each of backward_steps[c] is kept or dropped by the difficulty bias.
+        self.forward_steps = []
+        self.backward_steps = []
+        for square in range(self.size):
+            forward = {}
+            backward = {}
+            for piece in self.pieces:
+                ahead = self.forward[piece][square]
+                for target in squares(self.targets[piece][square]):
+                    steps = forward if ahead >> target & 1 else backward
+                    steps.setdefault(target, []).append(piece)
+            self.forward_steps.append(tuple((target, tuple(pieces)) for target, pieces in forward.items()))
+            self.backward_steps.append(tuple((target, tuple(pieces)) for target, pieces in backward.items()))
+
+
+    def moves(self, board):
+        """
+        The targets of every square of a board given as a list of rows of pieces, as one bitmask per square.
+        """
+        return [self.targets[piece][i * self.n + j] for i, row in enumerate(board) for j, piece in enumerate(row)]
+
+
+_move_tables = {}
+
+def move_table(m, n, max_stride=None):
+    """
+    Returns the MoveTable for the given dimensions, building it the first time it is asked for.
+    """
+    key = (m, n, max_stride)
+    if key not in _move_tables:
+        _move_tables[key] = MoveTable(m, n, max_stride)
+    return _move_tables[key]
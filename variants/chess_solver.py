@@ -1,51 +1,133 @@
+from chess_moves import move_table, squares
+
+
 class Chessboard:
+    """
+    Solver for a chess board puzzle: get from the top left square to 'X' in the bottom right, moving 
+    each time as the piece on the current square moves and never landing on a square twice.
+    Squares are numbered i * n + j and sets of squares are kept as int bitmasks, so the set of 
+    squares a path has visited is one int and checking a move against it is one &.
+    """
+
     def __init__(self, board):
         self.board = board
-        self.paths = set()
+        self.m = len(board)
+        self.n = len(board[0])
+        self.start = 0
+        self.goal = self.m * self.n - 1
+
+        # Bitmask of the squares each square's piece can move to
+        strides = [int(piece[1:]) for row in board for piece in row if piece[0] in 'rbq']
+        max_stride = max(strides) if strides and max(strides) > max(self.m, self.n) - 2 else None
+        self.moves = move_table(self.m, self.n, max_stride).moves(board)
+
+        # Squares from which 'X' can be reached at all, ignoring which squares a path has used up.
+        # Moves to any other square can never lead to a solution and are skipped.
+        self.reaches_goal = 1 << self.goal
+        grown = True
+        while grown:
+            grown = False
+            for square, targets in enumerate(self.moves):
+                if targets & self.reaches_goal and not self.reaches_goal >> square & 1:
+                    self.reaches_goal |= 1 << square
+                    grown = True
+
+        self.memo = {} # (square, visited) -> exact number of ways to finish from there, for the current solve()
+
 
     def neighbors(self, square):
         x, y = square
-        piece = self.board[x][y]
-
-        if piece[0] == 'p':
-            out = [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]
-        elif piece[0] == 'k':
-            out = [(x + 1, y + 2), (x - 1, y + 2), (x + 1, y - 2), (x - 1, y - 2), (x + 2, y + 1), (x - 2, y + 1), (x + 2, y - 1), (x - 2, y - 1)]
-        elif piece[0] == 'r':
-            stride = int(piece[1])
-            out = [(x + stride, y), (x - stride, y), (x, y + stride), (x, y - stride)]
-        elif piece[0] == 'b':
-            stride = int(piece[1])
-            out = [(x + stride, y + stride), (x - stride, y - stride), (x + stride, y - stride), (x - stride, y + stride)]
-        elif piece[0] == 'q':
-            stride = int(piece[1])
-            out = [(x + stride, y), (x - stride, y), (x, y + stride), (x, y - stride), (x + stride, y + stride), (x - stride, y - stride), (x + stride, y - stride), (x - stride, y + stride)]
-        
-        return [(i, j) for i, j in out if 0 <= i < 8 and 0 <= j < 8]
-    
+        return [divmod(target, self.n) for target in squares(self.moves[x * self.n + y])]
+
+
+    def count_from(self, square, visited, cap, path, witness):
+        """
+        Number of ways to finish a path that has visited the squares in visited and is now on square, 
+        counting no further than cap (None for no limit). The first full path found is copied into witness.
+        Counts that came out below the cap are exact and are remembered for the next time the same 
+        squares are visited in a different order.
+        """
+        if square == self.goal:
+            if not witness:
+                witness.extend(path)
+            return 1
+
+        key = (square, visited)
+        if key in self.memo:
+            return self.memo[key]
+
+        total = 0
+        options = self.moves[square] & self.reaches_goal & ~visited
+        while options:
+            low = options & -options
+            options ^= low
+            target = low.bit_length() - 1
+
+            path.append(target)
+            total += self.count_from(target, visited | low, None if cap is None else cap - total, path, witness)
+            path.pop()
+
+            if cap is not None and total >= cap:
+                return total
+
+        self.memo[key] = total
+        return total
+
+
+    def solve(self, cap=2):
+        """
+        Returns (path, count) where path is one solution as a list of squares, or None if there is none, 
+        and count is the number of solutions, counting no further than cap (None for no limit).
+        """
+        if not self.reaches_goal >> self.start & 1:
+            return None, 0
+
+        self.memo = {}
+        witness = []
+        count = self.count_from(self.start, 1 << self.start, cap, [self.start], witness)
+        if not witness:
+            return None, 0
+
+        return [divmod(square, self.n) for square in witness], count
+
+
+    def count_solutions(self, cap=None):
+        return self.solve(cap=cap)[1]
+
+
+    def is_solvable(self):
+        return self.count_solutions(cap=1) > 0
+
+
+    def has_unique_solution(self):
+        return self.count_solutions(cap=2) == 1
+
 
-    def find_paths_from_u(self, u, visited, path):
-        """Finds all paths from square u to the end using a recursive DFS approach."""
+    def paths_from(self, square, visited, path):
+        """
+        Yields every path from square to 'X' that avoids the squares in visited, each as a list of squares.
+        """
+        if square == self.goal:
+            yield [divmod(s, self.n) for s in path]
+            return
 
-        visited[u[0]][u[1]] = True
-        path.append(u)
+        options = self.moves[square] & self.reaches_goal & ~visited
+        while options:
+            low = options & -options
+            options ^= low
+            target = low.bit_length() - 1
 
-        if u == (7, 7):
-            self.paths.add(str(path))
-            print(path)
-        else:
-            for neighbor in self.neighbors(u):
-                if not visited[neighbor[0]][neighbor[1]]:
-                    self.find_paths_from_u(neighbor, visited, path)
-        
-        path.pop()
-        visited[u[0]][u[1]] = False
+            path.append(target)
+            yield from self.paths_from(target, visited | low, path)
+            path.pop()
 
 
     def find_paths_from_start(self):
-        visited = [[False for _ in range(8)] for _ in range(8)]
-        path = []
-        self.find_paths_from_u((0, 0), visited, path)
+        """
+        Every solution, as a list of paths. There can be exponentially many, use solve() or 
+        count_solutions() when only the number is needed.
+        """
+        return list(self.paths_from(self.start, 1 << self.start, [self.start]))
     
 
 
@@ -73,7 +155,7 @@ b = [
 
 
 if __name__ == '__main__':
-    cb = Chessboard(original)
-    paths = cb.find_paths_from_start()
-    print(paths)
-    print(len(paths))
\ No newline at end of file
+    for name, board in [('original', original), ('b', b)]:
+        cb = Chessboard(board)
+        path, count = cb.solve(cap=2)
+        print(f'{name}: {"unique" if count == 1 else "not unique" if count else "no"} solution, for example {path}')
\ No newline at end of file